@@ -1,6 +1,19 @@
 from pathlib import Path
+from contextlib import contextmanager
+from functools import wraps
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
 import toml
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
 
 #
 # Config
@@ -45,3 +58,215 @@ def path_expand(config, exclude=[]):
         if k not in exclude:
             config[k] = Path(v).expanduser()
     return config
+
+
+#
+# Profiling
+#
+_profiling = {'enabled': False, 'trace_memory': False}
+_HAS_RESET_PEAK = hasattr(tracemalloc, 'reset_peak')  # Python >= 3.9
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_spans = []
+_spans_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable_profiling(trace_memory=False):
+    """Enables recording of instrumented spans (disabled by default)
+
+    Parameters
+    ----------
+    trace_memory: boolean, optional
+        Specify whether to record peak Python memory allocations of spans
+        with `tracemalloc` (slows execution down significantly)
+
+    Notes
+    ----
+    `tracemalloc` peak and RSS are process-wide: `peak_traced_mb`,
+    `rss_delta_mb` and `max_rss_growth_mb` are only valid for spans
+    running single-threaded (not e.g in serving threads).
+    Before Python 3.9 (no `tracemalloc.reset_peak`), a span peak is the
+    process peak if it was raised during the span, else the max of the
+    traced memory at its start and end
+    """
+    _profiling['enabled'] = True
+    _profiling['trace_memory'] = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable_profiling():
+    """Disables recording of instrumented spans"""
+    if _profiling['trace_memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _profiling['enabled'] = False
+    _profiling['trace_memory'] = False
+
+
+def is_profiling():
+    return _profiling['enabled']
+
+
+def reset_profiling():
+    """Discards all recorded spans"""
+    with _spans_lock:
+        _spans.clear()
+
+
+def get_spans():
+    """Returns a copy of recorded spans as a list of dictionaries"""
+    with _spans_lock:
+        return [dict(s) for s in _spans]
+
+
+@contextmanager
+def span(name, rows=None, **attrs):
+    """Records wall time, rows processed and peak memory of a code block
+
+    No-op if profiling is not enabled (see `enable_profiling`).
+
+    Parameters
+    ----------
+    name: str
+        Name of the span
+
+    rows: int, optional
+        Number of rows processed (can also be set on the yielded record)
+
+    Returns
+    -------
+    Context manager yielding the span record (dict)
+
+    Notes
+    ----
+    Besides `peak_traced_mb` (see `enable_profiling`), a span records
+    `rss_mb`, the resident memory at its end, and `rss_delta_mb`, its
+    change over the span (Linux only), as well as `max_rss_growth_mb`,
+    the increase of the process peak RSS during the span (0 unless the
+    span sets a new process high-water mark)
+    """
+    if not _profiling['enabled']:
+        yield {}
+        return
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    trace_memory = _profiling['trace_memory'] and tracemalloc.is_tracing()
+    current, start_peak = tracemalloc.get_traced_memory() if trace_memory else (0, 0)
+    if trace_memory:
+        if stack:
+            stack[-1]['_peak'] = max(stack[-1]['_peak'], start_peak if _HAS_RESET_PEAK else current)
+        if _HAS_RESET_PEAK:
+            tracemalloc.reset_peak()
+            start_peak = 0
+
+    record = {'name': name, 'rows': rows, 'parent': stack[-1]['name'] if stack else None,
+              'depth': len(stack), 'pid': os.getpid(), 'tid': threading.get_ident(),
+              '_peak': current, **attrs}
+    stack.append(record)
+    rss_start, max_rss_start = _current_rss(), _max_rss()
+    record['start'] = time.time()
+    t0 = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['wall_time'] = time.perf_counter() - t0
+        stack.pop()
+        peak = record.pop('_peak')
+        if trace_memory:
+            current, end_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, current, end_peak if end_peak > start_peak else 0)
+            record['peak_traced_mb'] = peak / 2**20
+            if stack:
+                stack[-1]['_peak'] = max(stack[-1]['_peak'], peak)
+        rss = _current_rss()
+        if rss is not None:
+            record['rss_mb'] = rss / 2**20
+            record['rss_delta_mb'] = (rss - rss_start) / 2**20
+        if max_rss_start is not None:
+            record['max_rss_growth_mb'] = (_max_rss() - max_rss_start) / 2**20
+        with _spans_lock:
+            _spans.append(record)
+
+
+def _current_rss():
+    """Returns resident set size of the process in bytes (None if unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _max_rss():
+    """Returns peak resident set size of the process so far in bytes (None if unavailable)"""
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux (bytes on macOS)
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 2**10
+
+
+def instrument(name=None):
+    """Decorator wrapping each call of a function in a `span`
+
+    The number of rows processed is inferred from the first dimension of
+    the returned DataFrame/array (or of the first array of a returned tuple).
+    Calls are forwarded untouched when profiling is disabled.
+    """
+    def decorator(f):
+        span_name = name or '{}.{}'.format(f.__module__, f.__qualname__)
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not _profiling['enabled']:
+                return f(*args, **kwargs)
+            with span(span_name) as record:
+                result = f(*args, **kwargs)
+                record['rows'] = _nb_rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def _nb_rows(result):
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    shape = getattr(result, 'shape', None)
+    if shape:
+        return int(shape[0])
+    return None
+
+
+def export_profile(path, format='json'):
+    """Exports recorded spans to a file
+
+    Parameters
+    ----------
+    path: str
+        Path of the file to create
+
+    format: str, optional
+        Specify 'json' (list of spans) or 'chrome' (trace viewable in
+        chrome://tracing or https://ui.perfetto.dev)
+
+    Returns
+    -------
+    None
+    """
+    spans = get_spans()
+    if format == 'json':
+        content = spans
+    elif format == 'chrome':
+        content = {'traceEvents': [
+            {'name': s['name'], 'ph': 'X', 'ts': s['start'] * 1e6,
+             'dur': s['wall_time'] * 1e6, 'pid': s['pid'], 'tid': s['tid'],
+             'args': {k: v for k, v in s.items()
+                      if k not in ['name', 'start', 'wall_time', 'pid', 'tid']}}
+            for s in spans]}
+    else:
+        raise ValueError('format should be "json" or "chrome".')
+
+    with open(Path(path), 'w') as f:
+        json.dump(content, f, indent=1)
@@ -1,20 +1,29 @@
+from .base import Dataset
+
 from .astorga_arg import load_data as load_data_astorga_arg
+from .astorga_arg import load_dataset as load_dataset_astorga_arg
 from .astorga_arg import load_spectra as load_spectra_astorga_arg
 from .astorga_arg import load_measurements as load_measurements_astorga_arg
 
 from .schmitter_vnm import load_data as load_data_schmitter_vnm
+from .schmitter_vnm import load_dataset as load_dataset_schmitter_vnm
 from .schmitter_vnm import load_spectra as load_spectra_schmitter_vnm
 from .schmitter_vnm import load_spectra_rep as load_spectra_rep_schmitter_vnm
 from .schmitter_vnm import load_measurements as load_measurements_schmitter_vnm
 
 from .kssl import access_to_csv
+from .kssl import load_dataset as load_dataset_kssl
 
 
-__all__ = ['load_data_astorga_arg',
+__all__ = ['Dataset',
+           'load_data_astorga_arg',
+           'load_dataset_astorga_arg',
            'load_spectra_astorga_arg',
            'load_measurements_astorga_arg',
            'load_data_schmitter_vnm',
+           'load_dataset_schmitter_vnm',
            'load_spectra_schmitter_vnm',
            'load_spectra_rep_schmitter_vnm',
            'load_measurements_schmitter_vnm',
-           'access_to_csv']
+           'access_to_csv',
+           'load_dataset_kssl']
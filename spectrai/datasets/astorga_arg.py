@@ -2,12 +2,14 @@ from pathlib import Path
 import re
 import pandas as pd
 from os.path import join
-from spectrai.core import get_astorga_config
+from spectrai.core import get_astorga_config, instrument
+from .base import Dataset, rows_to_array
 
 
 DATA_SPECTRA, DATA_MEASUREMENTS = get_astorga_config()
 
 
+@instrument()
 def load_spectra(path=DATA_SPECTRA):
     """ Returns DRIFT/MIRs spectra, Romina's data, Argentina, 2015"""
     path = Path(path)
@@ -23,6 +25,7 @@ def load_spectra(path=DATA_SPECTRA):
     return df[sorted(df.columns)].sort_index(ascending=False)
 
 
+@instrument()
 def load_measurements(path=DATA_MEASUREMENTS,
                       analytes=['Fe', 'Ti', 'Ca', 'P', 'Ba']):
     """ Returns XRF measurements of soil samples, Argentina, 2015"""
@@ -32,6 +35,7 @@ def load_measurements(path=DATA_MEASUREMENTS,
     return df_labels[['Arg Code'] + analytes]
 
 
+@instrument()
 def load_data(path_X=DATA_SPECTRA,
               path_y=DATA_MEASUREMENTS):
     """ Returns all available data amenable to DL models as numpy arrays."""
@@ -46,3 +50,14 @@ def load_data(path_X=DATA_SPECTRA,
     y_names = y.iloc[:, 1:].columns.values
     y = y.iloc[:, 1:].to_numpy(dtype='float32')
     return (X, X_names, y, y_names, instances_id)
+
+
+@instrument()
+def load_dataset(path_X=DATA_SPECTRA,
+                 path_y=DATA_MEASUREMENTS):
+    """ Returns all available data as a `Dataset` (spectra row-major, single copy)"""
+    X = load_spectra(Path(path_X))
+    y = load_measurements(Path(path_y))
+    return Dataset(rows_to_array(X), y=y.iloc[:, 1:].to_numpy(dtype='float32'),
+                   wavenumbers=X.index.values, analytes=y.columns.values[1:],
+                   ids=X.columns.values)
@@ -1,3 +1,12 @@
+from pathlib import Path
+import copy
+from scipy.spatial import cKDTree
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
 def select_rows(df, where):
     """Performs a series of rows selection in a DataFrame
 
@@ -46,3 +55,314 @@ def chunk(len_array, nb_chunks=3):
     step = len_array // nb_chunks
     bounds = [x*step for x in range(nb_chunks)] + [len_array]
     return zip(bounds, bounds[1:])
+
+
+def lat_lon_to_xyz(lat, lon):
+    """Projects latitudes/longitudes (decimal degrees) on the unit sphere
+
+    Returns
+    -------
+    numpy array
+        Cartesian coordinates of shape (n, 3)
+    """
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon),
+                            np.cos(lat) * np.sin(lon),
+                            np.sin(lat)])
+
+
+class GeoIndex:
+    """Spatial index resolving geographic filters to sample ids
+
+    Locations are projected on the unit sphere and indexed by a KD-tree
+    so that radius queries (great-circle distance) are exact.
+
+    Parameters
+    ----------
+    ids: array
+        Identifiers of located samples (e.g `smp_id`)
+
+    lat: array
+        Latitudes in decimal degrees
+
+    lon: array
+        Longitudes in decimal degrees
+    """
+    def __init__(self, ids, lat, lon):
+        self.ids = np.asarray(ids)
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.tree = cKDTree(lat_lon_to_xyz(self.lat, self.lon))
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Returns ids located within a bounding box
+
+        Notes
+        ----
+        Bounding boxes crossing the antimeridian have min_lon > max_lon
+        """
+        mask = (self.lat >= min_lat) & (self.lat <= max_lat)
+        if min_lon <= max_lon:
+            mask &= (self.lon >= min_lon) & (self.lon <= max_lon)
+        else:
+            mask &= (self.lon >= min_lon) | (self.lon <= max_lon)
+        return np.unique(self.ids[mask])
+
+    def within_radius(self, lat, lon, radius_km):
+        """Returns ids located within `radius_km` (great-circle) of a point"""
+        angle = min(radius_km / EARTH_RADIUS_KM, np.pi)
+        chord = 2 * np.sin(angle / 2)
+        idx = self.tree.query_ball_point(lat_lon_to_xyz([lat], [lon])[0], chord + 1e-12)
+        return np.unique(self.ids[np.array(idx, dtype=int)])
+
+    def save(self, path):
+        """Persists index to a '.npz' file"""
+        np.savez(Path(path), ids=self.ids, lat=self.lat, lon=self.lon)
+
+    @classmethod
+    def load(cls, path):
+        """Loads index persisted with `save`"""
+        with np.load(Path(path)) as data:
+            return cls(data['ids'], data['lat'], data['lon'])
+
+
+class Dataset:
+    """Container of spectra, targets, wavenumbers and sample ids
+
+    Subsets are lazy: they share the underlying (possibly memory-mapped)
+    arrays and only keep track of selected rows and columns. Contiguous
+    selections (wavenumber ranges, slices of rows) are returned as array
+    views. Arbitrary (e.g shuffled) rows are copies: they are gathered
+    once, on first access of `X` or `y`, and cached in the subset.
+
+    Parameters
+    ----------
+    X: array, shape (n_samples, n_wavenumbers)
+        Spectra
+
+    y: array, shape (n_samples, n_analytes), optional
+        Target(s)
+
+    wavenumbers: array, shape (n_wavenumbers,), optional
+        Wavenumbers where absorbance measured
+
+    analytes: array, shape (n_analytes,), optional
+        Names/ids of target(s)
+
+    ids: array, shape (n_samples,), optional
+        Sample identifiers (e.g `smp_id`)
+
+    attrs: dict, optional
+        Any other dataset specific information (e.g lookup tables)
+    """
+    def __init__(self, X, y=None, wavenumbers=None, analytes=None, ids=None, attrs=None):
+        n_samples, n_wavenumbers = X.shape
+        if y is not None and len(y) != n_samples:
+            raise ValueError('X and y should have the same number of rows.')
+        if ids is not None and len(ids) != n_samples:
+            raise ValueError('X and ids should have the same number of rows.')
+        self._X = X
+        self._y = None if y is None else (y.reshape(-1, 1) if y.ndim == 1 else y)
+        self._wavenumbers = np.arange(n_wavenumbers) if wavenumbers is None else np.asarray(wavenumbers)
+        n_analytes = 0 if self._y is None else self._y.shape[1]
+        self._analytes = np.arange(n_analytes) if analytes is None else np.asarray(analytes)
+        self._ids = np.arange(n_samples) if ids is None else np.asarray(ids)
+        self.attrs = {} if attrs is None else attrs
+        self._rows = slice(0, n_samples)
+        self._cols = slice(0, n_wavenumbers)
+        self._targets = slice(0, n_analytes)
+        self._cache = {}
+
+    def _view(self, rows=None, cols=None, targets=None):
+        dataset = copy.copy(self)
+        dataset._cache = {}
+        if rows is not None:
+            dataset._rows = rows
+        if cols is not None:
+            dataset._cols = cols
+        if targets is not None:
+            dataset._targets = targets
+        return dataset
+
+    def _get(self, name, array, cols):
+        if isinstance(self._rows, slice):
+            return _subset(array, self._rows, cols)
+        if name not in self._cache:
+            self._cache[name] = _subset(array, self._rows, cols)
+        return self._cache[name]
+
+    @property
+    def X(self):
+        return self._get('X', self._X, self._cols)
+
+    @property
+    def y(self):
+        return None if self._y is None else self._get('y', self._y, self._targets)
+
+    @property
+    def wavenumbers(self):
+        return self._wavenumbers[self._cols]
+
+    @property
+    def analytes(self):
+        return self._analytes[self._targets]
+
+    @property
+    def ids(self):
+        return self._ids[self._rows]
+
+    @property
+    def shape(self):
+        return (len(self), len(self.wavenumbers))
+
+    def __len__(self):
+        return len(self._ids[self._rows])
+
+    def __repr__(self):
+        return 'Dataset(n_samples={}, n_wavenumbers={}, analytes={})'.format(
+            len(self), len(self.wavenumbers), list(self.analytes))
+
+    def take(self, indices):
+        """Returns subset of rows by position (e.g split index arrays)"""
+        positions = np.arange(self._X.shape[0])[self._rows][indices]
+        return self._view(rows=_as_slice(positions))
+
+    def sel(self, ids=None, wavenumbers=None, analytes=None):
+        """Selects subset by sample ids, wavenumbers range and/or analytes
+
+        Parameters
+        ----------
+        ids: array, optional
+            Sample identifiers to select (in the requested order)
+
+        wavenumbers: tuple, optional
+            Range of wavenumbers as (high, low), bounds included
+
+        analytes: list, optional
+            Analytes to select (among those of the dataset)
+
+        Returns
+        -------
+        Dataset
+            New dataset sharing the same underlying arrays
+        """
+        dataset = self
+        if ids is not None:
+            lookup = dict(zip(self.ids.tolist(), range(len(self))))
+            missing = [i for i in np.asarray(ids).tolist() if i not in lookup]
+            if missing:
+                raise KeyError('ids not found: {}'.format(missing[:10]))
+            dataset = dataset.take([lookup[i] for i in np.asarray(ids).tolist()])
+        if wavenumbers is not None:
+            high, low = max(wavenumbers), min(wavenumbers)
+            positions = np.arange(len(self._wavenumbers))[self._cols]
+            mask = (self.wavenumbers <= high) & (self.wavenumbers >= low)
+            dataset = dataset._view(cols=_as_slice(positions[mask]))
+        if analytes is not None:
+            analytes = [analytes] if np.isscalar(analytes) else list(analytes)
+            positions = np.arange(len(self._analytes))[self._targets]
+            lookup = dict(zip(self.analytes.tolist(), positions))
+            missing = [a for a in analytes if a not in lookup]
+            if missing:
+                raise KeyError('analytes not found: {}'.format(missing))
+            dataset = dataset._view(targets=_as_slice(np.array([lookup[a] for a in analytes])))
+        return dataset
+
+    def split_indices(self, test_size=0.2, shuffle=True, seed=None):
+        """Returns (train, test) index arrays of positions to use with `take`"""
+        idx = np.arange(len(self))
+        if shuffle:
+            idx = np.random.default_rng(seed).permutation(len(self))
+        n_test = int(np.ceil(test_size * len(self))) if test_size < 1 else int(test_size)
+        return idx[n_test:], idx[:n_test]
+
+    def to_tuple(self):
+        """Returns (X, X_names, y, y_names, instances_id) as legacy `load_data`"""
+        return (self.X, self.wavenumbers, self.y, self.analytes, self.ids)
+
+    def save(self, folder):
+        """Persists materialized dataset as '.npy' files in a folder
+
+        Notes
+        ----
+        Object arrays of ids/analytes are saved as numbers if possible,
+        fixed-width strings otherwise (e.g mixed names and ids of analytes)
+        """
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        np.save(folder / 'X.npy', np.ascontiguousarray(self.X))
+        np.save(folder / 'wavenumbers.npy', _fixed_width(self.wavenumbers))
+        np.save(folder / 'ids.npy', _fixed_width(self.ids))
+        if self._y is not None:
+            np.save(folder / 'y.npy', self.y)
+            np.save(folder / 'analytes.npy', _fixed_width(self.analytes))
+
+    @classmethod
+    def load(cls, folder, mmap_mode='r'):
+        """Loads dataset persisted with `save`, spectra memory-mapped by default"""
+        folder = Path(folder)
+        y, analytes = None, None
+        if (folder / 'y.npy').exists():
+            y, analytes = np.load(folder / 'y.npy'), np.load(folder / 'analytes.npy')
+        return cls(np.load(folder / 'X.npy', mmap_mode=mmap_mode), y=y,
+                   wavenumbers=np.load(folder / 'wavenumbers.npy'), analytes=analytes,
+                   ids=np.load(folder / 'ids.npy'))
+
+
+def rows_to_array(df, columns=None, dtype='float32'):
+    """Converts a DataFrame with samples as columns (e.g spectra indexed by
+    wavenumber) to a row-major (n_samples, n_rows) array in a single copy
+
+    Parameters
+    ----------
+    df: DataFrame
+        DataFrame of numeric values, one sample per column
+
+    columns: list, optional
+        Columns (samples) to convert, all if None
+
+    dtype: str, optional
+        Specify dtype of the array
+
+    Returns
+    -------
+    numpy array
+        C-contiguous array of shape (n_samples, len(df))
+    """
+    values = df.to_numpy()
+    if columns is not None:
+        positions = df.columns.get_indexer(columns)
+        out = np.empty((len(positions), len(df)), dtype=dtype)
+        for i, j in enumerate(positions):
+            out[i] = values[:, j]
+        return out
+    return np.array(values.T, dtype=dtype, order='C')
+
+
+def _fixed_width(array):
+    """Converts object arrays to numeric or fixed-width string arrays (no pickle)"""
+    array = np.asarray(array)
+    if array.dtype != object:
+        return array
+    if all(isinstance(a, (int, np.integer)) for a in array):
+        return array.astype(np.int64)
+    if all(isinstance(a, (float, np.floating)) for a in array):
+        return array.astype(np.float64)
+    return array.astype(str)
+
+
+def _subset(array, rows, cols):
+    """Indexes 2D array returning a view if both rows and cols are slices"""
+    if isinstance(rows, slice) or isinstance(cols, slice):
+        return array[rows, cols]
+    return array[np.ix_(rows, cols)]
+
+
+def _as_slice(positions):
+    """Converts positions to a slice if contiguous and increasing (to get views)"""
+    positions = np.asarray(positions, dtype=np.intp)
+    if len(positions) == 0:
+        return slice(0, 0)
+    if np.all(np.diff(positions) == 1):
+        return slice(int(positions[0]), int(positions[-1]) + 1)
+    return positions
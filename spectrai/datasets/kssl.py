@@ -11,8 +11,8 @@ For further information on KSSL database contact:
 """
 import subprocess
 from pathlib import Path
-from .base import select_rows, chunk
-from spectrai.core import get_kssl_config
+from .base import select_rows, chunk, GeoIndex, Dataset
+from spectrai.core import get_kssl_config, instrument
 import pandas as pd
 import numpy as np
 import re
@@ -62,6 +62,7 @@ def access_to_csv(in_folder=None, out_folder=DATA_NORM, db_name=DB_NAME):
         raise OSError('Execution of access2csv.sh failed.')
 
 
+@instrument()
 def _get_layer_analyte_tbl():
     """Returns relevant clean subset of `layer_analyte.csv` KSSL DB table.
 
@@ -87,6 +88,7 @@ def _get_layer_analyte_tbl():
         .astype({'calc_value': float})
 
 
+@instrument()
 def _get_layer_tbl():
     """Returns relevant clean subset of `analyte.csv` KSSL DB table.
 
@@ -101,6 +103,25 @@ def _get_layer_tbl():
         .astype({'lims_pedon_id': 'int32', 'lims_site_id': 'int32'})
 
 
+@instrument()
+def _get_layer_site_tbl():
+    """Returns `lay_id` to `lims_site_id` lookup from `layer.csv` KSSL DB table.
+
+    Notes
+    ----
+    Unlike `_get_layer_tbl`, layers are kept whatever their depth or pedon
+
+    Returns
+    -------
+    Pandas DataFrame
+        New DataFrame with selected columns, rows
+    """
+    return pd.read_csv(DATA_NORM / 'layer.csv', usecols=['lay_id', 'lims_site_id'], low_memory=False) \
+        .dropna() \
+        .astype({'lims_site_id': 'int32'})
+
+
+@instrument()
 def _get_sample_tbl():
     """Returns relevant clean subset of `sample.csv` KSSL DB table.
 
@@ -118,6 +139,7 @@ def _get_sample_tbl():
         .loc[:, ['smp_id', 'lay_id']]
 
 
+@instrument()
 def _get_mirs_det_tbl(valid_name=['XN', 'XS']):
     """Returns relevant clean subset of `mir_scan_det_data.csv` KSSL DB table.
 
@@ -137,6 +159,7 @@ def _get_mirs_det_tbl(valid_name=['XN', 'XS']):
             'scan_path_name': lambda d: re.search(r'X.', str(d))[0] in valid_name})
 
 
+@instrument()
 def _get_mirs_mas_tbl():
     """Returns relevant clean subset of `mir_scan_mas_data.csv` KSSL DB table.
 
@@ -149,6 +172,31 @@ def _get_mirs_mas_tbl():
         .loc[:, ['smp_id', 'mir_scan_mas_id']]
 
 
+@instrument()
+def _get_site_tbl():
+    """Returns relevant clean subset of `lims_site.csv` KSSL DB table.
+
+    Notes
+    ----
+    Only sites with valid standardized decimal degrees coordinates selected
+
+    Returns
+    -------
+    Pandas DataFrame
+        New DataFrame with selected columns, rows
+    """
+    return pd.read_csv(DATA_NORM / 'lims_site.csv', low_memory=False) \
+        .loc[:, ['lims_site_id', 'latitude_std_decimal_degrees', 'longitude_std_decimal_degrees']] \
+        .dropna() \
+        .rename(columns={'latitude_std_decimal_degrees': 'latitude',
+                         'longitude_std_decimal_degrees': 'longitude'}) \
+        .pipe(select_rows, {
+            'latitude': lambda d: -90 <= d <= 90,
+            'longitude': lambda d: -180 <= d <= 180}) \
+        .astype({'lims_site_id': 'int32'})
+
+
+@instrument()
 def _get_lookup_smp_id_scan_path():
     """Returns relevant clean subset of `mir_scan_mas_data.csv` KSSL DB table.
 
@@ -162,6 +210,7 @@ def _get_lookup_smp_id_scan_path():
         .astype({'smp_id': int, 'scan_path_name': 'string'})
 
 
+@instrument()
 def build_analyte_dim_tbl(out_folder=DATA_KSSL):
     """Builds/creates analyte_dim dim table (star schema) for KSSL dataset
 
@@ -177,6 +226,7 @@ def build_analyte_dim_tbl(out_folder=DATA_KSSL):
     return df
 
 
+@instrument()
 def build_taxonomy_dim_tbl(out_folder=DATA_KSSL):
     """Returns relevant subset of `lims_ped_tax_hist.csv` KSSL DB table
 
@@ -198,10 +248,33 @@ def build_taxonomy_dim_tbl(out_folder=DATA_KSSL):
     return df
 
 
+@instrument()
 def build_location_dim_tbl(out_folder=DATA_KSSL):
-    pass
+    """Builds/creates location_dim dim table (star schema) for KSSL dataset
+
+    Notes
+    ----
+    A spatial index of samples location is persisted alongside
+    as `location_idx.npz` (see `load_location_index`)
+
+    Returns
+    -------
+    Pandas DataFrame
+        New DataFrame with selected columns, rows
+    """
+    df = pd.merge(
+        pd.merge(_get_sample_tbl(), _get_layer_site_tbl(), on='lay_id'),
+        _get_site_tbl(), on='lims_site_id') \
+        .loc[:, ['smp_id', 'lims_site_id', 'latitude', 'longitude']] \
+        .drop_duplicates(subset='smp_id')
+
+    df.to_csv(out_folder / 'location_dim_tbl.csv', index=False)
+    GeoIndex(df['smp_id'].values, df['latitude'].values, df['longitude'].values) \
+        .save(out_folder / 'location_idx.npz')
+    return df
 
 
+@instrument()
 def build_sample_analysis_fact_tbl(out_folder=DATA_KSSL):
     """Builds/creates sample_analysis fact table (star schema) for KSSL dataset
 
@@ -218,12 +291,15 @@ def build_sample_analysis_fact_tbl(out_folder=DATA_KSSL):
     return df
 
 
+@instrument()
 def build_kssl_star_tbl():
     """Builds/creates star schema version of the KSSL DB"""
     print('Building analyte_dim_tbl...')
     build_analyte_dim_tbl()
     print('Building taxonomy_dim_tbl...')
     build_taxonomy_dim_tbl()
+    print('Building location_dim_tbl...')
+    build_location_dim_tbl()
     print('Building spectra_dim_tbl...')
     bundle_spectra_dim_tbl()
     print('Building sample_analysis_fact_tbl...')
@@ -231,6 +307,7 @@ def build_kssl_star_tbl():
     print('Success!')
 
 
+@instrument()
 def export_spectra(in_folder=None, out_folder=DATA_KSSL,
                    nb_decimals=4, max_wavenumber=4000, valid_name=['XN', 'XS'], nb_chunks=1):
     """Exports KSSL MIRS spectra into a series of .csv files
@@ -288,6 +365,7 @@ def export_spectra(in_folder=None, out_folder=DATA_KSSL,
         df.to_csv(out_folder / 'spectra_{}_{}.csv'.format(l_bound, u_bound-1), index=False)
 
 
+@instrument()
 def bundle_spectra_dim_tbl(in_folder=DATA_SPECTRA, out_folder=DATA_KSSL, with_replicates=False):
     """Creates MIRS spectra dimension table of new KSSL star-like schema
 
@@ -331,12 +409,90 @@ def bundle_spectra_dim_tbl(in_folder=DATA_SPECTRA, out_folder=DATA_KSSL, with_re
     return df.reset_index()
 
 
-def load_spectra(in_folder=DATA_KSSL):
-    """Loads Spectra dimension table"""
-    return pd.read_csv(in_folder / 'spectra_dim_tbl.csv') \
-        .drop_duplicates(subset='smp_id', keep=False)
+@instrument()
+def load_spectra(in_folder=DATA_KSSL, smp_ids=None, chunksize=10000):
+    """Loads Spectra dimension table
+
+    Parameters
+    ----------
+    in_folder: string, optional
+        Specify the path of the folder containing the spectra dimension table
 
+    smp_ids: array, optional
+        Specify `smp_id` to load (all if None). Table is then read by
+        chunks of `chunksize` rows and only selected rows are kept
 
+    Returns
+    -------
+    Pandas DataFrame
+        Spectra dimension table
+    """
+    if smp_ids is None:
+        df = pd.read_csv(in_folder / 'spectra_dim_tbl.csv')
+    elif len(smp_ids) == 0:
+        df = pd.read_csv(in_folder / 'spectra_dim_tbl.csv', nrows=0)
+    else:
+        df = pd.concat([df_chunk[df_chunk['smp_id'].isin(smp_ids)]
+                        for df_chunk in iter_spectra(in_folder, chunksize)])
+    return df.drop_duplicates(subset='smp_id', keep=False)
+
+
+def iter_spectra(in_folder=DATA_KSSL, chunksize=10000):
+    """Iterates over Spectra dimension table by chunks of rows
+
+    Notes
+    ----
+    Unlike `load_spectra`, duplicated `smp_id` are not dropped
+    as the table is never loaded as a whole
+
+    Returns
+    -------
+    Iterator
+        Pandas DataFrames of at most `chunksize` rows
+    """
+    return pd.read_csv(in_folder / 'spectra_dim_tbl.csv', chunksize=chunksize)
+
+
+@instrument()
+def load_location(in_folder=DATA_KSSL):
+    """Loads location dimension table"""
+    return pd.read_csv(in_folder / 'location_dim_tbl.csv')
+
+
+@instrument()
+def load_location_index(in_folder=DATA_KSSL):
+    """Loads spatial index of samples location built by `build_location_dim_tbl`"""
+    return GeoIndex.load(in_folder / 'location_idx.npz')
+
+
+def select_smp_ids(bbox=None, radius=None, in_folder=DATA_KSSL):
+    """Resolves geographic filters to `smp_id` through the spatial index
+
+    Parameters
+    ----------
+    bbox: tuple, optional
+        Bounding box as (min_lat, min_lon, max_lat, max_lon) in decimal degrees
+
+    radius: tuple, optional
+        Circle as (lat, lon, radius_km)
+
+    Returns
+    -------
+    numpy array
+        Selected `smp_id` (None if no filter specified)
+    """
+    if bbox is None and radius is None:
+        return None
+    index = load_location_index(in_folder)
+    smp_ids = index.ids
+    if bbox is not None:
+        smp_ids = np.intersect1d(smp_ids, index.within_bbox(*bbox))
+    if radius is not None:
+        smp_ids = np.intersect1d(smp_ids, index.within_radius(*radius))
+    return smp_ids
+
+
+@instrument()
 def load_taxonomy(in_folder=DATA_KSSL):
     """Loads taxonomy dimension table
 
@@ -359,14 +515,17 @@ def get_tax_orders_lookup_tbl(order_to_int=True):
     return dict(key_values)
 
 
+@instrument()
 def load_fact_tbl(in_folder=DATA_KSSL):
     return pd.read_csv(in_folder / 'sample_analysis_fact_tbl.csv')
 
 
+@instrument()
 def load_analytes(in_folder=DATA_KSSL, like=None):
     return pd.read_csv(in_folder / 'analyte_dim_tbl.csv')
 
 
+@instrument()
 def load_data_analytes(features=[622], targets=[725]):
     """Loads data to predict analyte(s) from other analyte(s)"""
     df_fact = load_fact_tbl()
@@ -383,29 +542,43 @@ def load_data_analytes(features=[622], targets=[725]):
     return X, X_names, y, y_names, instances_id
 
 
-def load_target(analytes=725):
+@instrument()
+def load_target(analytes=725, smp_ids=None):
     """Loads target analytes + auxiliary attributes `lay_depth_to_top`
-       and `order_id` for specified analytes"""
+       and `order_id` for specified analytes (and `smp_id` if specified)
+
+    Returns an empty DataFrame if no sample matches"""
     analytes = [analytes] if not isinstance(analytes, list) else analytes
+    columns = ['smp_id', 'lay_depth_to_top', 'order_id'] + analytes
     df = load_fact_tbl()
     df = df[df['analyte_id'].isin(analytes)]
+    if smp_ids is not None:
+        df = df[df['smp_id'].isin(smp_ids)]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
     df = pd.pivot_table(df, values='calc_value',
                         index=['smp_id', 'lims_pedon_id', 'lay_depth_to_top'],
                         columns=['analyte_id']).dropna().reset_index()
     df_tax = load_taxonomy()[['lims_pedon_id', 'taxonomic_order']]
     df = df.merge(df_tax, on='lims_pedon_id', how='left')
     df['order_id'] = df['taxonomic_order'].map(get_tax_orders_lookup_tbl())
-    columns = ['smp_id', 'lay_depth_to_top', 'order_id'] + analytes
     return df[columns] \
         .drop_duplicates(subset='smp_id', keep=False)
 
 
-def load_data(analytes=725, shuffle=True):
-    """Loads data (spectra + target + auxiliary attributes for specified analytes"""
+@instrument()
+def load_data(analytes=725, shuffle=True, bbox=None, radius=None):
+    """Loads data (spectra + target + auxiliary attributes for specified analytes
+
+    Geographic filters `bbox` (min_lat, min_lon, max_lat, max_lon) and
+    `radius` (lat, lon, radius_km) are resolved to `smp_id` through the
+    spatial index before any spectra are read (see `select_smp_ids`).
+    Arrays are empty if no sample matches them
+    """
     analytes = [analytes] if not isinstance(analytes, list) else analytes
-    df = load_fact_tbl()
-    df_target = load_target(analytes)
-    df_spectra = load_spectra()
+    smp_ids = select_smp_ids(bbox=bbox, radius=radius)
+    df_target = load_target(analytes, smp_ids=smp_ids)
+    df_spectra = load_spectra(smp_ids=None if smp_ids is None else df_target['smp_id'].values)
     df = df_target.merge(df_spectra, on='smp_id')
     if shuffle:
         df = df.sample(frac=1)
@@ -416,3 +589,59 @@ def load_data(analytes=725, shuffle=True):
     X = df.iloc[:, wn_idx:].to_numpy('float32')
     y = df.iloc[:, 1:wn_idx].to_numpy()
     return (X, X_names, y, y_names, instances_id)
+
+
+@instrument()
+def load_dataset(analytes=725, shuffle=True, bbox=None, radius=None, seed=None):
+    """Loads data (spectra + target + auxiliary attributes) as a `Dataset`
+
+    Notes
+    ----
+    Unlike `load_data`, spectra are converted to a float32 array once,
+    straight from the spectra dimension table (only rows with targets
+    kept), rows being shuffled while gathered.
+
+    Parameters
+    ----------
+    analytes: int or list of int, optional
+        Specify target analytes id(s)
+
+    shuffle: boolean, optional
+        Specify whether to shuffle samples (as `load_data`, by default)
+
+    bbox: tuple, optional
+        Bounding box as (min_lat, min_lon, max_lat, max_lon) in decimal degrees
+
+    radius: tuple, optional
+        Circle as (lat, lon, radius_km)
+
+    seed: int, optional
+        Specify seed used for shuffling
+
+    Returns
+    -------
+    Dataset
+        With `lay_depth_to_top`, `order_id` and analytes as targets
+        (empty if no sample matches geographic filters)
+    """
+    analytes = [analytes] if not isinstance(analytes, list) else analytes
+    df_target = load_target(analytes, smp_ids=select_smp_ids(bbox=bbox, radius=radius))
+    df_spectra = load_spectra(smp_ids=df_target['smp_id'].values)
+
+    X_names = df_spectra.columns[1:].values.astype('int32')
+    positions = pd.Index(df_spectra['smp_id']).get_indexer(df_target['smp_id'])
+    df_target = df_target[positions >= 0]
+    positions = positions[positions >= 0]
+    order = np.random.default_rng(seed).permutation(len(positions)) if shuffle \
+        else np.argsort(positions)
+    positions = positions[order]
+
+    # Spectra gathered (shuffled) once into a row-major float32 array
+    values = df_spectra.iloc[:, 1:].to_numpy()
+    X = np.empty((len(positions), values.shape[1]), dtype='float32')
+    for start in range(0, len(positions), 10000):
+        X[start:start + 10000] = values[positions[start:start + 10000]]
+
+    return Dataset(X, y=df_target.iloc[order, 1:].to_numpy(dtype='float64'),
+                   wavenumbers=X_names, analytes=df_target.columns[1:].values,
+                   ids=df_spectra['smp_id'].values[positions])
@@ -1,13 +1,16 @@
 from pathlib import Path
 import re
 import pandas as pd
-from spectrai.core import get_schmitter_config
+import numpy as np
+from spectrai.core import get_schmitter_config, instrument
+from .base import Dataset, rows_to_array
 import brukeropusreader
 
 
 DATA_SPECTRA, DATA_SPECTRA_REP, DATA_MEASUREMENTS = get_schmitter_config()
 
 
+@instrument()
 def load_spectra(path=DATA_SPECTRA):
     """Returns DRIFT/MIRs spectra, Petra's data, Vietnam, 2007-2008"""
     path = Path(path)
@@ -28,6 +31,7 @@ def load_spectra(path=DATA_SPECTRA):
     return pd.concat(df_list, axis=1, ignore_index=False, sort=False).set_index('wavenumber')
 
 
+@instrument()
 def load_spectra_rep(path=DATA_SPECTRA_REP):
     """Returns DRIFT/MIRs spectra and their replicates, Petra's data, Vietnam, 2007-2008"""
     path = Path(path)
@@ -52,6 +56,7 @@ def load_spectra_rep(path=DATA_SPECTRA_REP):
     return df.reindex(sorted(df.columns), axis=1)
 
 
+@instrument()
 def load_measurements(path=DATA_MEASUREMENTS):
     path = Path(path)
     df_labels = pd.read_excel(path, sheet_name='Sheet1', usecols=list(range(2, 13)), na_values='-')
@@ -60,6 +65,7 @@ def load_measurements(path=DATA_MEASUREMENTS):
     return df_labels.set_index('mir_label')
 
 
+@instrument()
 def load_data(path_X=DATA_SPECTRA,
               path_y=DATA_MEASUREMENTS):
     """ Returns all available data amenable to DL models as numpy arrays."""
@@ -83,6 +89,21 @@ def load_data(path_X=DATA_SPECTRA,
     return (X, X_names, y, y_names, instances_id, lookup)
 
 
+@instrument()
+def load_dataset(path_X=DATA_SPECTRA,
+                 path_y=DATA_MEASUREMENTS):
+    """ Returns all available data as a `Dataset` (total to mir labels lookup in `attrs`)"""
+    X = load_spectra(Path(path_X))
+    y = load_measurements(Path(path_y))
+    common_ids = _get_common_ids(X, y)
+    y = y.loc[common_ids, :]
+    lookup = dict(zip(y.iloc[:, 0], common_ids))
+    return Dataset(rows_to_array(X, columns=common_ids),
+                   y=y.iloc[:, 1:].to_numpy(dtype='float32'),
+                   wavenumbers=X.index.values, analytes=y.columns.values[1:],
+                   ids=np.array(common_ids), attrs={'lookup': lookup})
+
+
 def _clean_column_name(name):
     if 'Av' in name:
         return 'Av{:03d}'.format(int(name.split('Av.')[1]))
@@ -0,0 +1,182 @@
+"""Batched DeepSHAP explanations of spectra models
+
+DeepSHAP cost grows with the size of the background set times the
+number of samples explained. To make wavenumber importance over
+thousands of KSSL samples feasible on CPU: (i) the background set is
+summarized by k-means into a few representative spectra; (ii)
+attributions are computed in fixed-size batches; (iii) attributions are
+cached on disk per (model fingerprint, background, smp_id) so that they
+are never computed twice for a given model and background.
+
+Requires `shap` (https://github.com/slundberg/shap), an optional dependency
+not installed with spectrai and only imported when attributions are computed.
+"""
+from pathlib import Path
+from sklearn.cluster import MiniBatchKMeans
+from spectrai.features.cache import hash_array
+import hashlib
+import numpy as np
+
+
+def summarize_background(X, n_samples=50, method='medoids', seed=None):
+    """Summarizes a background set of spectra
+
+    Parameters
+    ----------
+    X: array, shape (n, n_features)
+        Spectra (typically the training set)
+
+    n_samples: int, optional
+        Specify size of the summarized background
+
+    method: str, optional
+        Specify 'kmeans' (cluster centers), 'medoids' (spectra closest
+        to cluster centers) or 'random' (random sample)
+
+    seed: int, optional
+        Specify seed of the random generator
+
+    Returns
+    -------
+    array, shape (n_samples, n_features)
+        Background spectra
+    """
+    X = np.asarray(X, dtype=np.float32)
+    if n_samples >= len(X):
+        return X
+    if method == 'random':
+        return X[np.random.default_rng(seed).choice(len(X), n_samples, replace=False)]
+    if method not in ['kmeans', 'medoids']:
+        raise ValueError('method should be "kmeans", "medoids" or "random".')
+
+    kmeans = MiniBatchKMeans(n_clusters=n_samples, random_state=seed, n_init=3).fit(X)
+    if method == 'kmeans':
+        return kmeans.cluster_centers_.astype(np.float32)
+    distances = kmeans.transform(X)
+    return X[np.unique(np.argmin(distances, axis=0))]
+
+
+def model_fingerprint(model):
+    """Returns a hex digest identifying a Keras model architecture and weights"""
+    h = hashlib.blake2b(digest_size=16)
+    if hasattr(model, 'to_json'):
+        h.update(model.to_json().encode())
+    for w in model.get_weights():
+        h.update(hash_array(w).encode())
+    return h.hexdigest()
+
+
+class AttributionCache:
+    """Caches attributions on disk per (model fingerprint, background, sample id)
+
+    Each entry stores the hash of the explained spectrum so that it is
+    recomputed if the spectrum behind an id changed (e.g other preprocessing).
+
+    Parameters
+    ----------
+    cache_dir: str
+        Folder where attributions are stored as `<fingerprint>_<background hash>/<id>.npz`
+
+    fingerprint: str
+        Model fingerprint (see `model_fingerprint`)
+
+    background: array
+        Background spectra used by the explainer
+    """
+    def __init__(self, cache_dir, fingerprint, background):
+        self.path = Path(cache_dir) / '{}_{}'.format(fingerprint, hash_array(background))
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _file(self, _id):
+        return self.path / '{}.npz'.format(_id)
+
+    def get(self, ids, X):
+        """Returns dictionary of cached attributions for ids whose spectrum is unchanged"""
+        cached = {}
+        for _id, x in zip(ids, X):
+            if self._file(_id).exists():
+                with np.load(self._file(_id)) as entry:
+                    if str(entry['x_hash']) == hash_array(x):
+                        cached[_id] = entry['attribution']
+        return cached
+
+    def put(self, ids, X, attributions):
+        for _id, x, attribution in zip(ids, X, attributions):
+            np.savez(self._file(_id), attribution=attribution, x_hash=hash_array(x))
+
+
+def _as_array(shap_values):
+    """Normalizes shap outputs to shape (n_samples, n_features, n_outputs)
+
+    Notes
+    ----
+    Channel axis of `Conv1D` inputs (n_samples, n_features, 1) is squeezed
+    """
+    if isinstance(shap_values, list):
+        shap_values = np.stack(shap_values, axis=-1)
+    shap_values = np.asarray(shap_values)
+    if shap_values.ndim == 2:
+        return shap_values[..., np.newaxis]
+    if shap_values.ndim == 4 and shap_values.shape[2] == 1:
+        return shap_values[:, :, 0, :]
+    return shap_values
+
+
+def explain(model, X, ids, background, batch_size=64, cache_dir=None, explainer=None):
+    """Computes DeepSHAP attributions of spectra by batches
+
+    Parameters
+    ----------
+    model: Keras model
+        Model to explain
+
+    X: array, shape (n_samples, n_features)
+        Spectra to explain
+
+    ids: array, shape (n_samples,)
+        Identifiers (e.g `smp_id`) of spectra, used as cache keys
+
+    background: array
+        Background spectra (see `summarize_background`)
+
+    batch_size: int, optional
+        Specify number of spectra explained at once
+
+    cache_dir: str, optional
+        Specify folder caching attributions. No caching if None
+
+    explainer: object, optional
+        Specify explainer exposing `shap_values` (`shap.DeepExplainer` if None)
+
+    Returns
+    -------
+    array, shape (n_samples, n_features, n_outputs)
+        Attributions
+    """
+    ids = np.asarray(ids)
+    if len(ids) != len(X):
+        raise ValueError('X and ids should have the same length.')
+
+    cached = {}
+    if cache_dir is not None:
+        cache = AttributionCache(cache_dir, model_fingerprint(model), background)
+        cached = cache.get(ids, X)
+    todo = np.array([i for i, _id in enumerate(ids) if _id not in cached], dtype=int)
+
+    if len(todo) and explainer is None:
+        import shap
+        explainer = shap.DeepExplainer(model, background)
+
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start:start + batch_size]
+        attributions = _as_array(explainer.shap_values(X[batch]))
+        cached.update(zip(ids[batch], attributions))
+        if cache_dir is not None:
+            cache.put(ids[batch], X[batch], attributions)
+
+    return np.stack([cached[_id] for _id in ids])
+
+
+def wavenumber_importance(attributions):
+    """Returns mean absolute attribution per wavenumber, shape (n_features, n_outputs)"""
+    return np.mean(np.abs(attributions), axis=0)
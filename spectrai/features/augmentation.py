@@ -0,0 +1,120 @@
+"""On-the-fly spectral data augmentation
+
+Random baseline offset and slope, multiplicative scatter, wavenumber
+shift and noise are applied to each minibatch with a few vectorized
+NumPy operations, so that models (CNNs in particular) can be trained on
+an unlimited stream of augmented spectra without materializing them.
+
+For further information on spectral data augmentation:
+    * Bjerrum, E. J., Glahder, M. & Skov, T. (2017). Data augmentation of
+      spectral data for convolutional neural network (CNN) based deep
+      chemometrics. arXiv:1710.01927.
+"""
+import numpy as np
+
+
+class SpectraAugmenter:
+    """Randomly alters batches of spectra
+
+    Parameters
+    ----------
+    betashift: float, optional
+        Specify max baseline offset (in absorbance units)
+
+    slopeshift: float, optional
+        Specify max baseline slope (in absorbance units across the whole
+        spectral range, baseline tilting around the middle wavenumber)
+
+    multishift: float, optional
+        Specify max relative multiplicative scatter
+
+    wnshift: float, optional
+        Specify max shift along the wavenumber axis (in number of channels,
+        fractional shifts are linearly interpolated)
+
+    noise: float, optional
+        Specify standard deviation of additive gaussian noise
+        (relative to each spectrum standard deviation)
+
+    seed: int, optional
+        Specify seed of the random generator
+
+    Returns
+    -------
+    Spectra augmenter
+    """
+    def __init__(self, betashift=0.05, slopeshift=0.05, multishift=0.05,
+                 wnshift=0, noise=0, seed=None):
+        self.betashift = betashift
+        self.slopeshift = slopeshift
+        self.multishift = multishift
+        self.wnshift = wnshift
+        self.noise = noise
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+    def _uniform(self, amplitude, size):
+        return self.rng.uniform(-amplitude, amplitude, size=(size, 1))
+
+    def augment(self, X):
+        """Returns randomly altered copy of spectra X (n_samples, n_features)"""
+        X = np.asarray(X, dtype=np.float32)
+        n, p = X.shape
+
+        if self.wnshift:
+            positions = np.arange(p) + self._uniform(self.wnshift, n)
+            positions = np.clip(positions, 0, p - 1)
+            low = np.floor(positions).astype(np.intp)
+            high = np.minimum(low + 1, p - 1)
+            weight = (positions - low).astype(np.float32)
+            X = np.take_along_axis(X, low, axis=1) * (1 - weight) + \
+                np.take_along_axis(X, high, axis=1) * weight
+
+        # Baseline offset and slope around the middle of the spectra
+        axis = np.linspace(-0.5, 0.5, p, dtype=np.float32)
+        offset = self._uniform(self.betashift, n) + self._uniform(self.slopeshift, n) * axis
+        multi = 1 + self._uniform(self.multishift, n)
+        X_aug = multi * X + offset
+
+        if self.noise:
+            scale = self.noise * X.std(axis=1, keepdims=True)
+            X_aug += scale * self.rng.standard_normal((n, p), dtype=np.float32)
+
+        return X_aug.astype(np.float32, copy=False)
+
+    def flow(self, X, y=None, batch_size=32, shuffle=True, add_channel=False):
+        """Generates augmented minibatches endlessly (Keras-compatible generator)
+
+        Parameters
+        ----------
+        X: array, shape (n_samples, n_features)
+            Spectra
+
+        y: array, optional
+            Target(s)
+
+        batch_size: int, optional
+            Specify number of spectra per batch
+
+        shuffle: boolean, optional
+            Specify whether to shuffle samples at each epoch
+
+        add_channel: boolean, optional
+            Specify whether to reshape batches to (batch_size, n_features, 1)
+            as expected by `Conv1D` layers
+
+        Returns
+        -------
+        Generator
+            Yields X_batch or (X_batch, y_batch). To be used as e.g:
+            `model.fit(augmenter.flow(X, y), steps_per_epoch=len(X) // 32)`
+        """
+        n = len(X)
+        while True:
+            idx = self.rng.permutation(n) if shuffle else np.arange(n)
+            for start in range(0, n, batch_size):
+                batch = idx[start:start + batch_size]
+                X_batch = self.augment(X[batch])
+                if add_channel:
+                    X_batch = X_batch[..., np.newaxis]
+                yield X_batch if y is None else (X_batch, y[batch])
@@ -0,0 +1,189 @@
+"""Content-hash memoization of preprocessing transformers outputs
+
+During hyperparameter searches the same preprocessing (e.g `TakeDerivative`
+with given parameters) is applied to the same folds for every downstream
+model hyperparameter. Wrapping transformers in `CachedTransformer` turns
+these repeated transforms into cache hits: outputs are keyed by a hash of
+the input array buffer and of the transformer parameters and kept in a
+bounded in-memory LRU, optionally spilling evicted outputs to .npy files
+loaded back as memory-mapped arrays.
+"""
+from collections import OrderedDict
+from pathlib import Path
+from sklearn.base import BaseEstimator, TransformerMixin
+import hashlib
+import threading
+import numpy as np
+
+
+def hash_array(X):
+    """Returns a hex digest of an array content, dtype and shape"""
+    X = np.ascontiguousarray(X)
+    h = hashlib.blake2b(digest_size=16)
+    h.update('{}{}'.format(X.dtype.str, X.shape).encode())
+    h.update(memoryview(X).cast('B'))
+    return h.hexdigest()
+
+
+def hash_params(transformer):
+    """Returns a hex digest of a transformer class and parameters"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(type(transformer).__qualname__.encode())
+    for name, value in sorted(transformer.get_params(deep=True).items()):
+        if isinstance(value, np.ndarray):
+            value = hash_array(value)
+        h.update('{}={!r};'.format(name, value).encode())
+    return h.hexdigest()
+
+
+class TransformerCache:
+    """Bounded LRU store of arrays with optional spill to disk
+
+    Parameters
+    ----------
+    max_bytes: int, optional
+        Specify max memory used by cached arrays
+
+    spill_dir: str, optional
+        Specify folder where arrays evicted from memory are saved
+        (and loaded back memory-mapped). No spill if None
+
+    max_spill_bytes: int, optional
+        Specify max disk space used in `spill_dir`
+
+    Notes
+    ----
+    Copies of a cache (e.g made by `sklearn.base.clone`) are the cache
+    itself so that it is shared across a search. It is not shared across
+    processes though, so prefer `n_jobs=1` or threads when searching.
+    """
+    def __init__(self, max_bytes=2**30, spill_dir=None, max_spill_bytes=2**33):
+        self.max_bytes = max_bytes
+        self.spill_dir = None if spill_dir is None else Path(spill_dir)
+        self.max_spill_bytes = max_spill_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._spilled = OrderedDict()
+        self._nbytes = 0
+        self._spilled_nbytes = 0
+        self._lock = threading.Lock()
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __len__(self):
+        return len(self._memory) + len(self._spilled)
+
+    def get(self, key):
+        """Returns cached (read-only) array or None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            if key in self._spilled:
+                self._spilled.move_to_end(key)
+                self.hits += 1
+                return np.load(self._spill_path(key), mmap_mode='r')
+            self.misses += 1
+            return None
+
+    def put(self, key, X):
+        """Caches array X (made read-only) under key and returns it
+
+        Notes
+        ----
+        X should not be a view of an array owned by the caller
+        """
+        X = np.asarray(X)
+        if X.nbytes > self.max_bytes:
+            return X
+        X.flags.writeable = False
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+            self._memory[key] = X
+            self._nbytes += X.nbytes
+            while self._nbytes > self.max_bytes:
+                old_key, old_X = self._memory.popitem(last=False)
+                self._nbytes -= old_X.nbytes
+                self._spill(old_key, old_X)
+        return X
+
+    def clear(self):
+        with self._lock:
+            for key in self._spilled:
+                self._spill_path(key).unlink()
+            self._memory.clear()
+            self._spilled.clear()
+            self._nbytes = self._spilled_nbytes = 0
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'in_memory': len(self._memory), 'spilled': len(self._spilled),
+                'memory_bytes': self._nbytes, 'spilled_bytes': self._spilled_nbytes}
+
+    def _spill_path(self, key):
+        return self.spill_dir / '{}.npy'.format(key)
+
+    def _spill(self, key, X):
+        if self.spill_dir is None or X.nbytes > self.max_spill_bytes or key in self._spilled:
+            return
+        np.save(self._spill_path(key), X)
+        self._spilled[key] = X.nbytes
+        self._spilled_nbytes += X.nbytes
+        while self._spilled_nbytes > self.max_spill_bytes:
+            old_key, nbytes = self._spilled.popitem(last=False)
+            self._spill_path(old_key).unlink()
+            self._spilled_nbytes -= nbytes
+
+
+default_cache = TransformerCache()
+
+
+class CachedTransformer(BaseEstimator, TransformerMixin):
+    """Creates scikit-learn transformer memoizing outputs of another transformer
+
+    Parameters
+    ----------
+    transformer: scikit-learn transformer
+        Transformer to wrap, e.g `TakeDerivative()`. Its parameters can be
+        searched as `transformer__<param>`
+
+    cache: TransformerCache, optional
+        Specify cache to use (module-level `default_cache` if None)
+
+    stateless: boolean, optional
+        Specify whether transformer output depends on its parameters and
+        input only (true for `SNV`, `TakeDerivative`, `DropSpectralRegions`).
+        If False, the data it was fitted on is part of the cache key
+
+    Returns
+    -------
+    scikit-learn custom transformer
+    """
+    def __init__(self, transformer, cache=None, stateless=True):
+        self.transformer = transformer
+        self.cache = cache
+        self.stateless = stateless
+
+    def fit(self, X, y=None):
+        self.transformer.fit(X, y)
+        self.fit_key_ = '' if self.stateless else hash_array(X)
+        return self
+
+    def transform(self, X, y=None):
+        cache = default_cache if self.cache is None else self.cache
+        key = hash_params(self.transformer) + getattr(self, 'fit_key_', '') + hash_array(X)
+        X_transformed = cache.get(key)
+        if X_transformed is None:
+            X_transformed = np.asarray(self.transformer.transform(X))
+            if np.shares_memory(X_transformed, X):
+                # Cached copy is made read-only, not the caller's array
+                X_transformed = X_transformed.copy()
+            X_transformed = cache.put(key, X_transformed)
+        return X_transformed
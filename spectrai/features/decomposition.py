@@ -0,0 +1,187 @@
+"""Streaming PCA and outlier screening of spectra libraries
+
+PCA is fitted by incremental SVD over row chunks so that the full
+spectra matrix never needs to be held in memory. Each sample is then
+screened with its Hotelling T² (distance within the PCA model) and
+Q-residual (squared reconstruction error, distance to the PCA model),
+both computed in the same chunked pass.
+
+For further information on PCA-based outlier detection:
+    * Jackson, J. E. & Mudholkar, G. S. (1979). Control procedures for
+      residuals associated with principal component analysis.
+      Technometrics, 21(3), 341-349.
+"""
+from pathlib import Path
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.decomposition import IncrementalPCA
+from sklearn.utils.validation import check_array, check_is_fitted
+from scipy import stats
+import numpy as np
+
+
+class StreamingPCA(BaseEstimator, TransformerMixin):
+    """Creates scikit-learn PCA transformer fitted by chunks with outlier screening
+
+    Parameters
+    ----------
+    n_components: int, optional
+        Specify number of principal components
+
+    batch_size: int, optional
+        Specify number of rows per chunk when fitting/screening in-memory arrays
+
+    alpha: float, optional
+        Specify confidence level of T² and Q-residual limits
+
+    Returns
+    -------
+    scikit-learn custom transformer
+
+    Examples
+    --------
+    Fitting and screening the KSSL spectra library chunk by chunk:
+
+    >>> chunks = lambda: (df.iloc[:, 1:].to_numpy('float32')
+    ...                   for df in kssl.iter_spectra(chunksize=5000))
+    >>> pca = StreamingPCA(n_components=20).fit_chunks(chunks())
+    >>> t2, q = pca.calibrate(chunks())
+    >>> pca.save('kssl_pca.npz')
+    """
+    def __init__(self, n_components=10, batch_size=1000, alpha=0.95):
+        self.n_components = n_components
+        self.batch_size = batch_size
+        self.alpha = alpha
+
+    def partial_fit(self, X, y=None):
+        X = check_array(X, dtype=[np.float64, np.float32])
+        if not hasattr(self, 'ipca_'):
+            self.ipca_ = IncrementalPCA(n_components=self.n_components)
+        self.ipca_.partial_fit(X)
+        self._set_attributes()
+        return self
+
+    def fit_chunks(self, chunks):
+        """Fits PCA from an iterable of arrays (n_rows, n_features)
+
+        Notes
+        ----
+        Chunks are accumulated until they have at least `n_components`
+        rows and short ones (e.g the last one) are merged into the previous
+        chunk, as `IncrementalPCA` rejects chunks shorter than `n_components`
+        """
+        held = None
+        for X in chunks:
+            if held is None:
+                held = X
+            elif len(held) < self.n_components or len(X) < self.n_components:
+                held = np.concatenate([held, X])
+            else:
+                self.partial_fit(held)
+                held = X
+        if held is not None:
+            self.partial_fit(held)
+        return self
+
+    def fit(self, X, y=None):
+        """Fits PCA by chunks of `batch_size` rows and calibrates outlier limits"""
+        X = check_array(X, dtype=[np.float64, np.float32])
+        if hasattr(self, 'ipca_'):
+            del self.ipca_
+        self.fit_chunks(self._chunks(X))
+        self.calibrate(self._chunks(X))
+        return self
+
+    def _chunks(self, X):
+        # Chunks of at least max(batch_size, n_components) rows (as IncrementalPCA needs)
+        return np.array_split(X, max(1, len(X) // max(self.batch_size, self.n_components)))
+
+    def _set_attributes(self):
+        self.components_ = self.ipca_.components_
+        self.mean_ = self.ipca_.mean_
+        self.explained_variance_ = self.ipca_.explained_variance_
+        self.n_samples_seen_ = int(self.ipca_.n_samples_seen_)
+        self.t2_limit_ = self._t2_limit()
+
+    def _t2_limit(self):
+        n, k = self.n_samples_seen_, len(self.components_)
+        if n <= k:
+            return np.inf
+        return k * (n - 1) / (n - k) * stats.f.ppf(self.alpha, k, n - k)
+
+    def transform(self, X):
+        check_is_fitted(self, 'components_')
+        X = check_array(X, dtype=[np.float64, np.float32])
+        return (X - self.mean_) @ self.components_.T
+
+    def screen(self, X):
+        """Computes Hotelling T² and Q-residuals of spectra
+
+        Returns
+        -------
+        tuple of arrays, shape (n_samples,)
+            (T², Q-residuals)
+        """
+        check_is_fitted(self, 'components_')
+        X = check_array(X, dtype=[np.float64, np.float32])
+        Xc = X - self.mean_
+        scores = Xc @ self.components_.T
+        t2 = np.sum(scores ** 2 / self.explained_variance_, axis=1)
+        # Components are orthonormal: ||Xc - TP||² = ||Xc||² - ||T||²
+        q = np.maximum(np.einsum('ij,ij->i', Xc, Xc) - np.einsum('ij,ij->i', scores, scores), 0)
+        return t2, q
+
+    def screen_chunks(self, chunks):
+        """Computes Hotelling T² and Q-residuals from an iterable of arrays"""
+        results = [self.screen(X) for X in chunks]
+        if not results:
+            return np.empty(0), np.empty(0)
+        return tuple(np.concatenate(r) for r in zip(*results))
+
+    def calibrate(self, chunks):
+        """Screens the library the PCA was fitted on and sets Q-residual limit
+
+        Notes
+        ----
+        Q-residual limit uses Box's approximation of the Q distribution
+        as a scaled chi-squared g·χ²(h) with moments matched on the library.
+
+        Returns
+        -------
+        tuple of arrays, shape (n_samples,)
+            (T², Q-residuals) of the library
+        """
+        t2, q = self.screen_chunks(chunks)
+        mean, var = np.mean(q), np.var(q)
+        if var > 0:
+            g, h = var / (2 * mean), 2 * mean ** 2 / var
+            self.q_limit_ = g * stats.chi2.ppf(self.alpha, h)
+        else:
+            self.q_limit_ = mean
+        return t2, q
+
+    def is_outlier(self, X):
+        """Flags spectra beyond T² or Q-residual limits"""
+        check_is_fitted(self, 'q_limit_')
+        t2, q = self.screen(X)
+        return (t2 > self.t2_limit_) | (q > self.q_limit_)
+
+    def save(self, path):
+        """Persists loadings and limits to a '.npz' file"""
+        check_is_fitted(self, 'components_')
+        np.savez(Path(path), components=self.components_, mean=self.mean_,
+                 explained_variance=self.explained_variance_,
+                 n_samples_seen=self.n_samples_seen_, alpha=self.alpha,
+                 q_limit=getattr(self, 'q_limit_', np.nan))
+
+    @classmethod
+    def load(cls, path):
+        """Loads PCA persisted with `save` (for screening only)"""
+        with np.load(Path(path)) as data:
+            pca = cls(n_components=len(data['components']), alpha=float(data['alpha']))
+            pca.components_, pca.mean_ = data['components'], data['mean']
+            pca.explained_variance_ = data['explained_variance']
+            pca.n_samples_seen_ = int(data['n_samples_seen'])
+            if not np.isnan(data['q_limit']):
+                pca.q_limit_ = float(data['q_limit'])
+        pca.t2_limit_ = pca._t2_limit()
+        return pca
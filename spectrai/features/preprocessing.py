@@ -1,5 +1,6 @@
 from sklearn.base import BaseEstimator, TransformerMixin
 from scipy.signal import savgol_filter
+from spectrai.core import instrument
 import numpy as np
 
 
@@ -29,6 +30,7 @@ class TakeDerivative(BaseEstimator, TransformerMixin):
     def fit(self, X, y=None):
         return self
 
+    @instrument()
     def transform(self, X, y=None):
         return savgol_filter(X, self.window_length, self.polyorder, self.deriv)
 
@@ -50,6 +52,7 @@ class SNV(BaseEstimator, TransformerMixin):
     def fit(self, X, y=None):
         return self
 
+    @instrument()
     def transform(self, X, y=None):
         mean, std = np.mean(X, axis=1).reshape(-1, 1), np.std(X, axis=1).reshape(-1, 1)
         return (X - mean)/std
@@ -85,6 +88,7 @@ class DropSpectralRegions(BaseEstimator, TransformerMixin):
     def fit(self, X, y=None):
         return self
 
+    @instrument()
     def transform(self, X, y=None):
         regions = self._sanitize(self.regions)
         X_transformed = np.copy(X)
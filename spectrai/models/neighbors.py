@@ -0,0 +1,270 @@
+"""Spectral library nearest-neighbour index and memory-based local regression
+
+Spectra are compressed to PCA scores scaled to unit variance so that
+euclidean distances in the score space are Mahalanobis distances
+(a common spectral dissimilarity in soil spectroscopy). Scores are
+stored as float32 and searched either by blocked matrix products or
+by a KD-tree.
+
+For further information on memory-based learning in soil spectroscopy:
+    * Ramirez-Lopez, L. et al. (2013). The spectrum-based learner:
+      A new local approach for modeling soil vis-NIR spectra of complex
+      datasets. Geoderma, 195-196, 268-279.
+"""
+from pathlib import Path
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.utils.extmath import randomized_svd
+from sklearn.exceptions import NotFittedError
+from sklearn.utils.validation import check_array, check_is_fitted
+from scipy.spatial import cKDTree
+from .pls import KernelPLS
+import numpy as np
+
+
+class SpectralIndex:
+    """Nearest-neighbour index over PCA/Mahalanobis-compressed spectra
+
+    Parameters
+    ----------
+    n_components: int, optional
+        Specify number of principal components kept
+
+    whiten: boolean, optional
+        Specify whether to scale scores to unit variance (Mahalanobis distance)
+
+    algorithm: str, optional
+        Specify search algorithm: 'brute' (blocked BLAS) or 'kdtree'
+
+    max_block_size: int, optional
+        Specify max number of distances computed at once by 'brute' search
+
+    random_state: int, optional
+        Specify seed of the randomized SVD
+    """
+    def __init__(self, n_components=20, whiten=True, algorithm='brute',
+                 max_block_size=2**24, random_state=None):
+        if algorithm not in ['brute', 'kdtree']:
+            raise ValueError('algorithm should be "brute" or "kdtree".')
+        self.n_components = n_components
+        self.whiten = whiten
+        self.algorithm = algorithm
+        self.max_block_size = max_block_size
+        self.random_state = random_state
+        self._tree = None
+
+    @classmethod
+    def from_spectra(cls, df, **kwargs):
+        """Builds index from spectra dimension table (e.g `kssl.load_spectra()`)"""
+        return cls(**kwargs).fit(df.iloc[:, 1:].to_numpy('float32'), df['smp_id'].values)
+
+    def fit(self, X, ids):
+        """Fits PCA and indexes the spectra
+
+        Parameters
+        ----------
+        X: array, shape (n_samples, n_features)
+            Spectra of the library
+
+        ids: array, shape (n_samples,)
+            Identifiers (e.g `smp_id`) of the spectra
+
+        Returns
+        -------
+        self
+        """
+        X = check_array(X, dtype=np.float32)
+        self.mean_ = X.mean(axis=0)
+        _, s, Vt = randomized_svd(X - self.mean_, self.n_components,
+                                  random_state=self.random_state)
+        self.components_ = Vt.astype(np.float32)
+        self.scale_ = np.ones(len(s), dtype=np.float32)
+        if self.whiten:
+            self.scale_ = (s / np.sqrt(max(len(X) - 1, 1))).astype(np.float32)
+            # Components beyond the rank of X (null variance) are left unscaled
+            tol = s.max(initial=0) * max(X.shape) * np.finfo(np.float32).eps
+            self.scale_[s <= tol] = 1
+
+        self.scores_ = np.empty((0, len(s)), dtype=np.float32)
+        self.ids_ = np.empty(0, dtype=np.asarray(ids).dtype)
+        return self.add(X, ids)
+
+    def transform(self, X):
+        """Returns float32 (possibly whitened) PCA scores of spectra"""
+        self._check_fitted()
+        X = check_array(X, dtype=np.float32)
+        return ((X - self.mean_) @ self.components_.T) / self.scale_
+
+    def add(self, X, ids):
+        """Adds new spectra to the index using the already fitted PCA
+
+        Parameters
+        ----------
+        X: array, shape (n_samples, n_features)
+            New spectra
+
+        ids: array, shape (n_samples,)
+            Identifiers (e.g `smp_id`) of the new spectra
+
+        Returns
+        -------
+        self
+        """
+        ids = np.asarray(ids)
+        if len(ids) != len(X):
+            raise ValueError('X and ids should have the same length.')
+        if len(np.intersect1d(ids, self.ids_)) or len(np.unique(ids)) != len(ids):
+            raise ValueError('ids should be unique and not already indexed.')
+        self.scores_ = np.concatenate([self.scores_, self.transform(X)])
+        self.ids_ = np.concatenate([self.ids_, ids])
+        self._sq_norms = np.einsum('ij,ij->i', self.scores_, self.scores_)
+        self._tree = None
+        return self
+
+    def query(self, X, k=10, return_index=False):
+        """Finds the k nearest library spectra of each query spectrum
+
+        Parameters
+        ----------
+        X: array, shape (n_queries, n_features)
+            Query spectra
+
+        k: int, optional
+            Specify number of neighbours
+
+        return_index: boolean, optional
+            Specify whether to return positions in the index rather than ids
+
+        Returns
+        -------
+        tuple of arrays, shape (n_queries, k)
+            (distances, ids) of neighbours sorted by increasing distance
+        """
+        scores = self.transform(X)
+        k = min(k, len(self.ids_))
+        if self.algorithm == 'kdtree':
+            if self._tree is None:
+                self._tree = cKDTree(self.scores_)
+            dist, idx = self._tree.query(scores, k=k)
+            dist, idx = dist.reshape(len(scores), k), idx.reshape(len(scores), k)
+        else:
+            dist, idx = self._query_brute(scores, k)
+        return dist, idx if return_index else self.ids_[idx]
+
+    def _query_brute(self, scores, k):
+        block = max(1, self.max_block_size // len(self.ids_))
+        dist = np.empty((len(scores), k), dtype=np.float32)
+        idx = np.empty((len(scores), k), dtype=np.int64)
+        for start in range(0, len(scores), block):
+            q = scores[start:start + block]
+            d2 = np.einsum('ij,ij->i', q, q)[:, None] - 2 * q @ self.scores_.T + self._sq_norms
+            nn = np.argpartition(d2, k - 1, axis=1)[:, :k]
+            d2_nn = np.take_along_axis(d2, nn, axis=1)
+            order = np.argsort(d2_nn, axis=1)
+            idx[start:start + block] = np.take_along_axis(nn, order, axis=1)
+            dist[start:start + block] = np.sqrt(np.maximum(
+                np.take_along_axis(d2_nn, order, axis=1), 0))
+        return dist, idx
+
+    def _check_fitted(self):
+        if not hasattr(self, 'components_'):
+            raise NotFittedError('SpectralIndex is not fitted yet, call `fit` first.')
+
+    def save(self, path):
+        """Persists index to a '.npz' file"""
+        self._check_fitted()
+        np.savez(Path(path), mean=self.mean_, components=self.components_,
+                 scale=self.scale_, scores=self.scores_, ids=self.ids_,
+                 params=np.array([self.n_components, self.whiten, self.max_block_size]),
+                 algorithm=self.algorithm)
+
+    @classmethod
+    def load(cls, path):
+        """Loads index persisted with `save`"""
+        with np.load(Path(path), allow_pickle=False) as data:
+            n_components, whiten, max_block_size = data['params'].tolist()
+            index = cls(n_components=n_components, whiten=bool(whiten),
+                        algorithm=str(data['algorithm']), max_block_size=max_block_size)
+            index.mean_, index.components_ = data['mean'], data['components']
+            index.scale_, index.scores_, index.ids_ = data['scale'], data['scores'], data['ids']
+        index._sq_norms = np.einsum('ij,ij->i', index.scores_, index.scores_)
+        return index
+
+
+class LocalPLSRegression(BaseEstimator, RegressorMixin):
+    """Creates scikit-learn memory-based (local) PLS regressor
+
+    A PLS model is fitted on the `n_neighbors` library spectra
+    closest to each spectrum to predict.
+
+    Parameters
+    ----------
+    n_neighbors: int, optional
+        Specify number of neighbours used to fit each local model
+
+    n_components: int, optional
+        Specify number of latent variables of local PLS models
+
+    index_components: int, optional
+        Specify number of principal components of the spectral index
+
+    algorithm: str, optional
+        Specify search algorithm of the spectral index
+
+    index: SpectralIndex, optional
+        Specify prebuilt (e.g persisted library) index to search neighbours in.
+        Rows of X and y passed to `fit` should then be the indexed spectra
+        and their targets, in the order of `index.ids_`. Built on X if None
+
+    random_state: int, optional
+        Specify seed of the randomized SVD of the index built on X
+
+    Returns
+    -------
+    scikit-learn custom regressor
+
+    Examples
+    --------
+    Predicting from a persisted KSSL library index:
+
+    >>> index = SpectralIndex.load('kssl_index.npz')
+    >>> # X_lib, y_lib: spectra and targets of the library, ordered as index.ids_
+    >>> model = LocalPLSRegression(index=index).fit(X_lib, y_lib)
+    """
+    def __init__(self, n_neighbors=100, n_components=10, index_components=20,
+                 algorithm='brute', index=None, random_state=None):
+        self.n_neighbors = n_neighbors
+        self.n_components = n_components
+        self.index_components = index_components
+        self.algorithm = algorithm
+        self.index = index
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        self.X_ = check_array(X, dtype=np.float32)
+        self.y_ = check_array(y, ensure_2d=False)
+        if len(self.y_) != len(self.X_):
+            raise ValueError('X and y should have the same length.')
+        if self.index is not None:
+            self.index._check_fitted()
+            if len(self.index.ids_) != len(self.X_):
+                raise ValueError('X has {} rows, index has {} spectra.'.format(
+                    len(self.X_), len(self.index.ids_)))
+            self.index_ = self.index
+        else:
+            self.index_ = SpectralIndex(n_components=self.index_components,
+                                        algorithm=self.algorithm,
+                                        random_state=self.random_state) \
+                .fit(self.X_, np.arange(len(self.X_)))
+        return self
+
+    def predict(self, X):
+        check_is_fitted(self, 'index_')
+        X = check_array(X, dtype=np.float32)
+        _, neighbors = self.index_.query(X, k=self.n_neighbors, return_index=True)
+        n_components = min(self.n_components, neighbors.shape[1] - 1)
+        y_pred = np.empty((len(X),) + self.y_.shape[1:])
+        for i, nn in enumerate(neighbors):
+            model = KernelPLS(n_components=n_components, scale=False) \
+                .fit(self.X_[nn], self.y_[nn])
+            y_pred[i] = model.predict(X[i:i + 1])[0]
+        return y_pred
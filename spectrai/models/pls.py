@@ -0,0 +1,235 @@
+"""Fast PLS regression with component-path cross-validation
+
+Partial Least Squares is fitted with the modified kernel algorithm
+of Dayal & MacGregor (1997) operating on the precomputed XᵀX and XᵀY
+matrices. A single fit provides the regression coefficients of every
+model from 1 to `n_components` latent variables, hence choosing the
+number of components requires one fit per fold rather than one fit
+per fold and per number of components.
+
+References:
+    * Dayal, B. S. & MacGregor, J. F. (1997). Improved PLS algorithms.
+      Journal of Chemometrics, 11(1), 73-85.
+"""
+from sklearn.base import BaseEstimator, RegressorMixin
+from sklearn.model_selection import check_cv
+from sklearn.utils.validation import check_array, check_is_fitted
+from joblib import Parallel, delayed
+import numpy as np
+
+
+def kernel_pls(XtX, XtY, n_components):
+    """Fits PLS latent variables from precomputed cross-product matrices
+
+    Parameters
+    ----------
+    XtX: array, shape (n_features, n_features)
+        Cross-product matrix of centered (and possibly scaled) X
+
+    XtY: array, shape (n_features, n_targets)
+        Cross-product matrix of centered (and possibly scaled) X and Y
+
+    n_components: int
+        Number of latent variables to extract
+
+    Returns
+    -------
+    tuple of arrays
+        (R, P, Q) with X rotations R (n_features, n_components),
+        X loadings P (n_features, n_components) and
+        Y loadings Q (n_targets, n_components)
+    """
+    n_features, n_targets = XtY.shape
+    XtY = XtY.copy()
+    R = np.zeros((n_features, n_components))
+    P = np.zeros((n_features, n_components))
+    Q = np.zeros((n_targets, n_components))
+
+    for a in range(n_components):
+        if n_targets == 1:
+            w = XtY[:, 0].copy()
+        else:
+            eigvals, eigvecs = np.linalg.eigh(XtY.T @ XtY)
+            w = XtY @ eigvecs[:, np.argmax(eigvals)]
+        norm = np.linalg.norm(w)
+        if norm == 0:
+            # Y fully explained, remaining components are left null
+            break
+        w /= norm
+
+        r = w - R[:, :a] @ (P[:, :a].T @ w)
+        XtXr = XtX @ r
+        tt = r @ XtXr
+        p = XtXr / tt
+        q = (r @ XtY) / tt
+        XtY -= tt * np.outer(p, q)
+
+        R[:, a], P[:, a], Q[:, a] = r, p, q
+
+    return R, P, Q
+
+
+class KernelPLS(BaseEstimator, RegressorMixin):
+    """Creates scikit-learn PLS regressor predicting for all component counts
+
+    Parameters
+    ----------
+    n_components: int, optional
+        Specify maximum number of latent variables
+
+    scale: boolean, optional
+        Specify whether to scale X and Y to unit variance
+        (as scikit-learn `PLSRegression` does by default)
+
+    Returns
+    -------
+    scikit-learn custom regressor
+    """
+    def __init__(self, n_components=2, scale=True):
+        self.n_components = n_components
+        self.scale = scale
+
+    def fit(self, X, y):
+        X = check_array(X, dtype=np.float64)
+        y = check_array(y, dtype=np.float64, ensure_2d=False)
+        self._y_1d = y.ndim == 1
+        Y = y.reshape(-1, 1) if self._y_1d else y
+        if not 1 <= self.n_components <= min(X.shape):
+            raise ValueError('n_components should be in [1, min(n_samples, n_features)] = '
+                             '[1, {}], got {}.'.format(min(X.shape), self.n_components))
+
+        self.x_mean_, self.y_mean_ = X.mean(axis=0), Y.mean(axis=0)
+        self.x_std_, self.y_std_ = np.ones(X.shape[1]), np.ones(Y.shape[1])
+        if self.scale:
+            self.x_std_ = _safe_std(X)
+            self.y_std_ = _safe_std(Y)
+
+        Xc = (X - self.x_mean_) / self.x_std_
+        Yc = (Y - self.y_mean_) / self.y_std_
+        self.x_rotations_, self.x_loadings_, self.y_loadings_ = \
+            kernel_pls(Xc.T @ Xc, Xc.T @ Yc, self.n_components)
+        return self
+
+    @property
+    def coef_(self):
+        """Regression coefficients (n_features, n_targets) using all components"""
+        return self.coef_path_[-1]
+
+    @property
+    def coef_path_(self):
+        """Regression coefficients (n_components, n_features, n_targets) of each sub-model"""
+        check_is_fitted(self, 'x_rotations_')
+        contributions = np.einsum('ja,ka->ajk', self.x_rotations_, self.y_loadings_)
+        coefs = np.cumsum(contributions, axis=0)
+        return coefs * self.y_std_ / self.x_std_[:, None]
+
+    def predict_path(self, X):
+        """Predicts for every number of components from 1 to `n_components`
+
+        Parameters
+        ----------
+        X: array, shape (n_samples, n_features)
+            Spectra to predict
+
+        Returns
+        -------
+        array, shape (n_components, n_samples) or (n_components, n_samples, n_targets)
+            Predictions of each sub-model
+        """
+        check_is_fitted(self, 'x_rotations_')
+        X = check_array(X, dtype=np.float64)
+        T = ((X - self.x_mean_) / self.x_std_) @ self.x_rotations_
+        contributions = T.T[:, :, None] * self.y_loadings_.T[:, None, :]
+        Y_pred = np.cumsum(contributions, axis=0) * self.y_std_ + self.y_mean_
+        return Y_pred[..., 0] if self._y_1d else Y_pred
+
+    def predict(self, X, n_components=None):
+        """Predicts using `n_components` latent variables (all by default)"""
+        n_components = self.n_components if n_components is None else n_components
+        if not 1 <= n_components <= self.n_components:
+            raise ValueError('n_components should be in [1, {}], got {}.'.format(
+                self.n_components, n_components))
+        return self.predict_path(X)[n_components - 1]
+
+    def transform(self, X):
+        check_is_fitted(self, 'x_rotations_')
+        X = check_array(X, dtype=np.float64)
+        return ((X - self.x_mean_) / self.x_std_) @ self.x_rotations_
+
+
+def _safe_std(X):
+    std = X.std(axis=0, ddof=1) if len(X) > 1 else np.ones(X.shape[1])
+    std[std == 0] = 1
+    return std
+
+
+def _fit_predict_fold(X, y, train, test, n_components, scale):
+    model = KernelPLS(n_components=n_components, scale=scale).fit(X[train], y[train])
+    return test, model.predict_path(X[test])
+
+
+def cross_val_predict_path(X, y, n_components=20, cv=5, scale=True, n_jobs=None):
+    """Out-of-fold predictions of PLS models for every number of components
+
+    Parameters
+    ----------
+    X: array, shape (n_samples, n_features)
+        Spectra
+
+    y: array, shape (n_samples,) or (n_samples, n_targets)
+        Target(s)
+
+    n_components: int, optional
+        Specify maximum number of latent variables
+
+    cv: int or scikit-learn cross-validation generator, optional
+        Specify cross-validation splitting strategy (test folds should
+        partition the samples, e.g not `ShuffleSplit`)
+
+    scale: boolean, optional
+        Specify whether to scale X and Y to unit variance
+
+    n_jobs: int, optional
+        Specify number of folds fitted in parallel (joblib convention)
+
+    Returns
+    -------
+    array, shape (n_components, n_samples) or (n_components, n_samples, n_targets)
+        Out-of-fold predictions of each sub-model
+    """
+    X = check_array(X, dtype=np.float64)
+    y = check_array(y, dtype=np.float64, ensure_2d=False)
+    cv = check_cv(cv)
+    splits = list(cv.split(X, y))
+    test_indices = np.sort(np.concatenate([test for _, test in splits]))
+    if not np.array_equal(test_indices, np.arange(len(X))):
+        # As scikit-learn `cross_val_predict`, each sample should be tested exactly once
+        raise ValueError('cross_val_predict_path only works for partitions.')
+
+    folds = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_predict_fold)(X, y, train, test, n_components, scale)
+        for train, test in splits)
+
+    y_pred = np.zeros((n_components,) + y.shape)
+    for test, fold_pred in folds:
+        y_pred[:, test] = fold_pred
+    return y_pred
+
+
+def select_n_components(X, y, n_components=20, cv=5, scale=True, n_jobs=None):
+    """Selects number of PLS components minimizing cross-validated RMSE
+
+    Parameters
+    ----------
+    See `cross_val_predict_path`
+
+    Returns
+    -------
+    tuple
+        (best number of components, RMSE array of shape (n_components,))
+    """
+    y_pred = cross_val_predict_path(X, y, n_components=n_components, cv=cv,
+                                    scale=scale, n_jobs=n_jobs)
+    residuals = (y_pred - np.asarray(y, dtype=np.float64)).reshape(n_components, -1)
+    rmse = np.sqrt(np.mean(residuals ** 2, axis=1))
+    return int(np.argmin(rmse)) + 1, rmse
@@ -0,0 +1,354 @@
+"""Local inference server for spectra preprocessing + model pipelines
+
+A fitted pipeline (e.g `SNV` -> `TakeDerivative` -> `PLSRegression`) is
+loaded once and served over HTTP, either on a TCP port or on a Unix
+socket. Concurrent requests are micro-batched: spectra received within
+a latency budget are stacked and go through a single matrix transform
+and prediction.
+
+Endpoints:
+    * POST /predict  {"spectra": [[...], ...]} -> {"predictions": [...]}
+    * GET /stats     throughput and latency counters
+"""
+from concurrent.futures import Future
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import http.client
+import json
+import queue
+import socket
+import socketserver
+import threading
+import time
+import joblib
+import numpy as np
+
+
+def load_pipeline(path):
+    """Loads a fitted pipeline/model
+
+    Notes
+    ----
+    `.h5` and `.keras` files are loaded as Keras models, anything else
+    with joblib (scikit-learn pipelines)
+    """
+    path = Path(path)
+    if path.suffix in ['.h5', '.keras']:
+        from tensorflow.keras.models import load_model
+        return load_model(path, compile=False)
+    return joblib.load(path)
+
+
+class MicroBatcher:
+    """Groups concurrent prediction requests into single batch predictions
+
+    Parameters
+    ----------
+    predict: callable
+        Function mapping an array (n_samples, n_features) to predictions
+
+    max_batch_size: int, optional
+        Specify max number of spectra predicted at once (larger requests
+        are predicted by slices of `max_batch_size` spectra)
+
+    max_latency: float, optional
+        Specify max time (in seconds) a request waits for others to join its batch
+
+    n_features: int, optional
+        Specify expected number of features (wavenumbers). If None, the
+        number of features of the first successfully predicted request
+        is expected afterwards
+
+    dtype: str or numpy dtype, optional
+        Specify dtype spectra are cast to before prediction (float64 as
+        offline predictions from JSON values by default)
+
+    window: int, optional
+        Specify number of most recent requests used for latency percentiles
+    """
+    def __init__(self, predict, max_batch_size=256, max_latency=0.005,
+                 n_features=None, dtype='float64', window=1000):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.n_features = n_features
+        self.dtype = dtype
+        self._queue = queue.Queue()
+        self._pending = None
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'samples': 0, 'batches': 0, 'errors': 0}
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, X):
+        """Queues spectra (n_samples, n_features) and returns a `Future` of predictions"""
+        X = np.atleast_2d(np.asarray(X, dtype=self.dtype))
+        if X.ndim != 2:
+            raise ValueError('Spectra should be a 2D array (n_samples, n_features).')
+        if X.size == 0:
+            raise ValueError('Spectra should not be empty.')
+        if self.n_features is not None and X.shape[1] != self.n_features:
+            raise ValueError('Spectra have {} features, {} expected.'.format(
+                X.shape[1], self.n_features))
+        future = Future()
+        self._queue.put((X, future, time.perf_counter()))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        """Returns throughput and latency counters"""
+        with self._lock:
+            stats = dict(self._counters)
+            latencies = np.array(self._latencies)
+        elapsed = time.perf_counter() - self._start_time
+        stats['uptime_s'] = elapsed
+        stats['samples_per_s'] = stats['samples'] / elapsed
+        stats['mean_batch_size'] = stats['samples'] / max(stats['batches'], 1)
+        for name, q in [('p50', 50), ('p95', 95), ('p99', 99)]:
+            stats['latency_{}_ms'.format(name)] = \
+                float(np.percentile(latencies, q) * 1000) if len(latencies) else None
+        return stats
+
+    def _next_batch(self):
+        if self._pending is not None:
+            item, self._pending = self._pending, None
+        else:
+            item = self._queue.get()
+        if item is None:
+            return None
+        batch, n_samples = [item], len(item[0])
+        deadline = item[2] + self.max_latency
+        while n_samples < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            if n_samples + len(item[0]) > self.max_batch_size:
+                # Carried over to next batch to keep batches within max_batch_size
+                self._pending = item
+                break
+            batch.append(item)
+            n_samples += len(item[0])
+        return batch
+
+    def _predict(self, X):
+        y = np.concatenate([np.asarray(self.predict(X[i:i + self.max_batch_size]))
+                            for i in range(0, len(X), self.max_batch_size)])
+        if len(y) != len(X):
+            raise ValueError('Number of predictions does not match number of spectra.')
+        return y
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            sizes = [len(X) for X, _, _ in batch]
+            try:
+                y = self._predict(np.concatenate([X for X, _, _ in batch]))
+                results = np.split(y, np.cumsum(sizes)[:-1])
+            except Exception as e:
+                # Predicts requests one by one so that only faulty ones fail
+                results = [e] if len(batch) == 1 else [self._safe_predict(X) for X, _, _ in batch]
+
+            now = time.perf_counter()
+            with self._lock:
+                if self.n_features is None:
+                    # Expected width is only learnt from a successful prediction
+                    self.n_features = next((X.shape[1] for (X, _, _), r in zip(batch, results)
+                                            if not isinstance(r, Exception)), None)
+                self._counters['batches'] += 1
+                self._counters['requests'] += len(batch)
+                self._counters['samples'] += sum(sizes)
+                self._counters['errors'] += sum(isinstance(r, Exception) for r in results)
+                self._latencies.extend(now - t for _, _, t in batch)
+
+            for (_, future, _), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _safe_predict(self, X):
+        try:
+            return self._predict(X)
+        except Exception as e:
+            return e
+
+
+class _PredictionHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/stats':
+            return self._reply(404, {'error': 'Not found'})
+        self._reply(200, self.server.batcher.stats())
+
+    def do_POST(self):
+        if self.path != '/predict':
+            return self._reply(404, {'error': 'Not found'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            X = json.loads(self.rfile.read(length))['spectra']
+            y = self.server.batcher.submit(X).result(timeout=self.server.timeout_s)
+        except (ValueError, KeyError, TypeError) as e:
+            return self._reply(400, {'error': str(e)})
+        except Exception as e:
+            return self._reply(500, {'error': str(e)})
+        self._reply(200, {'predictions': y.tolist()})
+
+    def _reply(self, code, body):
+        content = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class PredictionServer:
+    """Serves a pipeline over HTTP (TCP or Unix socket) with micro-batching
+
+    Parameters
+    ----------
+    pipeline: object or str
+        Fitted pipeline/model exposing `predict` or path to load it from
+
+    host: str, optional
+        Specify host to bind on (ignored if `unix_socket` specified)
+
+    port: int, optional
+        Specify TCP port (0 picks a free one)
+
+    unix_socket: str, optional
+        Specify path of a Unix socket to bind on instead of TCP
+
+    max_batch_size: int, optional
+        Specify max number of spectra predicted at once
+
+    max_latency: float, optional
+        Specify max time (in seconds) a request waits for others to join its batch
+
+    n_features: int, optional
+        Specify expected number of features (wavenumbers). Taken from the
+        Keras model `input_shape` or the pipeline `n_features_in_` if None
+        and available (pipelines starting with e.g `SNV` do not expose it)
+
+    dtype: str or numpy dtype, optional
+        Specify dtype spectra are cast to before prediction
+
+    timeout: float, optional
+        Specify max time (in seconds) a request waits for its predictions
+    """
+    def __init__(self, pipeline, host='127.0.0.1', port=8000, unix_socket=None,
+                 max_batch_size=256, max_latency=0.005, n_features=None,
+                 dtype='float64', timeout=30):
+        if isinstance(pipeline, (str, Path)):
+            pipeline = load_pipeline(pipeline)
+        self.pipeline = pipeline
+        if n_features is None:
+            n_features = _n_features_in(pipeline)
+        self.batcher = MicroBatcher(pipeline.predict, max_batch_size, max_latency,
+                                    n_features=n_features, dtype=dtype)
+
+        if unix_socket is not None:
+            unix_socket = Path(unix_socket)
+            if unix_socket.exists():
+                unix_socket.unlink()
+            self.httpd = _UnixHTTPServer(str(unix_socket), _PredictionHandler)
+        else:
+            self.httpd = ThreadingHTTPServer((host, port), _PredictionHandler)
+        self.httpd.batcher = self.batcher
+        self.httpd.timeout_s = timeout
+        self.unix_socket = unix_socket
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.httpd.server_address
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self):
+        """Serves in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.batcher.close()
+        if self.unix_socket is not None and self.unix_socket.exists():
+            self.unix_socket.unlink()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+def _n_features_in(pipeline):
+    input_shape = getattr(pipeline, 'input_shape', None)  # Keras models
+    if input_shape is not None and len(input_shape) > 1:
+        return input_shape[1]
+    return getattr(pipeline, 'n_features_in_', None)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_socket = str(path)
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_socket)
+
+
+def request_predictions(X, host='127.0.0.1', port=8000, unix_socket=None, timeout=30):
+    """Local client requesting predictions of spectra from a `PredictionServer`
+
+    Returns
+    -------
+    numpy array
+        Predictions
+    """
+    if unix_socket is not None:
+        conn = _UnixHTTPConnection(unix_socket, timeout=timeout)
+    else:
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        body = json.dumps({'spectra': np.asarray(X).tolist()})
+        conn.request('POST', '/predict', body, {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        content = json.loads(response.read())
+    finally:
+        conn.close()
+    if response.status != 200:
+        raise RuntimeError('Prediction request failed ({}): {}'.format(
+            response.status, content.get('error')))
+    return np.array(content['predictions'])
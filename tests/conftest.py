@@ -0,0 +1,8 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def spectra():
+    """Smooth random spectra (200 samples, 50 wavenumbers)"""
+    return np.random.RandomState(0).normal(size=(200, 50)).cumsum(axis=1)
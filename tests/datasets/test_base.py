@@ -1,6 +1,8 @@
-from spectrai.datasets.base import select_rows, chunk
+from spectrai.datasets.base import select_rows, chunk, GeoIndex, Dataset
 from pandas.testing import assert_frame_equal
 import pandas as pd
+import numpy as np
+import pytest
 
 
 def test_select_rows():
@@ -12,3 +14,56 @@ def test_select_rows():
 
 def test_chunk():
     assert list(chunk(10, 3)) == [(0, 3), (3, 6), (6, 10)]
+
+
+def test_geo_index(tmp_path):
+    # Paris, London, New York
+    index = GeoIndex([1, 2, 3], [48.8566, 51.5074, 40.7128], [2.3522, -0.1278, -74.0060])
+    assert list(index.within_radius(48.8566, 2.3522, 340)) == [1]
+    assert list(index.within_radius(48.8566, 2.3522, 350)) == [1, 2]
+    assert list(index.within_bbox(40, -80, 52, 0)) == [2, 3]
+    index.save(tmp_path / 'idx.npz')
+    assert list(GeoIndex.load(tmp_path / 'idx.npz').within_bbox(45, 170, 55, 10)) == [1, 2]
+
+
+def test_dataset_views():
+    X = np.arange(40, dtype='float32').reshape(5, 8)
+    y = np.arange(10.).reshape(5, 2)
+    ds = Dataset(X, y=y, wavenumbers=np.arange(4000, 3992, -1),
+                 analytes=['a', 'b'], ids=[10, 11, 12, 13, 14])
+    subset = ds.sel(ids=[11, 12, 13], wavenumbers=(3998, 3995), analytes=['b'])
+    assert np.shares_memory(subset.X, X) and np.shares_memory(subset.y, y)
+    np.testing.assert_array_equal(subset.X, X[1:4, 2:6])
+    np.testing.assert_array_equal(subset.y, y[1:4, 1:])
+
+    train, test = ds.split_indices(test_size=0.4, seed=0)
+    assert len(ds.take(train)) == 3
+    np.testing.assert_array_equal(ds.take(test).X, X[test])
+    np.testing.assert_array_equal(ds.take(test).sel(ids=ds.ids[test][::-1]).ids, ds.ids[test][::-1])
+
+    targets = ds.sel(analytes=['b', 'a']).sel(analytes='a')
+    np.testing.assert_array_equal(targets.y, y[:, :1])
+    with pytest.raises(KeyError):
+        ds.sel(analytes='b').sel(analytes='a')
+    with pytest.raises(ValueError):
+        Dataset(X, y=y[:4])
+    with pytest.raises(ValueError):
+        Dataset(X, ids=[1, 2])
+
+
+def test_dataset_fancy_rows_gathered_once():
+    ds = Dataset(np.random.rand(6, 3), y=np.random.rand(6), ids=np.arange(6))
+    shuffled = ds.take([3, 0, 5])
+    assert shuffled.X is shuffled.X and shuffled.y is shuffled.y
+    np.testing.assert_array_equal(shuffled.X, ds.X[[3, 0, 5]])
+    assert shuffled.take([1, 2]).X is not shuffled.X
+
+
+def test_dataset_persistence(tmp_path):
+    ds = Dataset(np.random.rand(4, 3), y=np.random.rand(4, 2), ids=np.array([1, 2, 3, 4], dtype=object),
+                 analytes=np.array(['order_id', 725], dtype=object))
+    ds.save(tmp_path)
+    loaded = Dataset.load(tmp_path)
+    assert isinstance(loaded.X, np.memmap)
+    assert loaded.ids.dtype == np.int64 and list(loaded.analytes) == ['order_id', '725']
+    np.testing.assert_array_equal(loaded.sel(ids=[2, 3]).X, ds.X[1:3])
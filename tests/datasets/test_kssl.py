@@ -0,0 +1,61 @@
+from spectrai.datasets import kssl
+from functools import partial
+import pandas as pd
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def star_schema(tmp_path, monkeypatch):
+    """Synthetic KSSL tables: samples 1001, 1002 in Paris, 1003 in New York, 1004 in London"""
+    norm = tmp_path / 'normalized'
+    norm.mkdir()
+    pd.DataFrame({'smp_id': [1001, 1002, 1003, 1004], 'lay_id': [1, 2, 3, 4]}) \
+        .to_csv(norm / 'sample.csv', index=False)
+    pd.DataFrame({'lay_id': [1, 2, 3, 4], 'lims_pedon_id': [10, 10, 11, 12],
+                  'lims_site_id': [100, 100, 101, 102], 'lay_depth_to_top': [0, 10, np.nan, 0]}) \
+        .to_csv(norm / 'layer.csv', index=False)
+    pd.DataFrame({'lims_site_id': [100, 101, 102],
+                  'latitude_std_decimal_degrees': [48.8566, 40.7128, 51.5074],
+                  'longitude_std_decimal_degrees': [2.3522, -74.0060, -0.1278]}) \
+        .to_csv(norm / 'lims_site.csv', index=False)
+    pd.DataFrame({'smp_id': [1001, 1002, 1003, 1004], 'lims_pedon_id': [10, 10, 11, 12],
+                  'lay_depth_to_top': [0, 10, 5, 0], 'analyte_id': 725,
+                  'calc_value': [1., 2., 3., 4.]}) \
+        .to_csv(tmp_path / 'sample_analysis_fact_tbl.csv', index=False)
+    pd.DataFrame({'lims_pedon_id': [10, 11, 12],
+                  'taxonomic_order': ['alfisols', 'mollisols', 'alfisols']}) \
+        .to_csv(tmp_path / 'taxonomy_dim_tbl.csv', index=False)
+    spectra = pd.DataFrame(np.arange(12.).reshape(4, 3), columns=['4000', '3998', '3996'])
+    spectra.insert(0, 'smp_id', [1004, 1003, 1002, 1001])
+    spectra.to_csv(tmp_path / 'spectra_dim_tbl.csv', index=False)
+
+    monkeypatch.setattr(kssl, 'DATA_NORM', norm)
+    for name in ['load_fact_tbl', 'load_taxonomy', 'load_spectra', 'select_smp_ids']:
+        monkeypatch.setattr(kssl, name, partial(getattr(kssl, name), in_folder=tmp_path))
+    kssl.build_location_dim_tbl(out_folder=tmp_path)
+    return tmp_path
+
+
+def test_location_keeps_layers_without_depth(star_schema):
+    df = kssl.load_location(star_schema)
+    assert sorted(df['smp_id']) == [1001, 1002, 1003, 1004]
+    assert list(kssl.load_location_index(star_schema).within_radius(40.7128, -74.0060, 10)) == [1003]
+
+
+def test_load_with_geo_filters(star_schema):
+    paris = (48.8566, 2.3522, 50)
+    ds = kssl.load_dataset(radius=paris, shuffle=False)
+    assert sorted(ds.ids) == [1001, 1002]
+    np.testing.assert_array_equal(ds.sel(ids=[1001]).X, [[9., 10., 11.]])
+    np.testing.assert_array_equal(ds.sel(ids=[1002], analytes=725).y, [[2.]])
+
+    X, X_names, y, _, ids = kssl.load_data(bbox=(45, -10, 55, 10))
+    assert sorted(ids) == [1001, 1002, 1004] and list(X_names) == [4000, 3998, 3996]
+
+
+def test_load_with_geo_filters_matching_nothing(star_schema):
+    X, X_names, y, _, ids = kssl.load_data(radius=(0, 0, 1))
+    assert X.shape == (0, 3) and len(y) == len(ids) == 0
+    ds = kssl.load_dataset(radius=(0, 0, 1))
+    assert ds.shape == (0, 3) and ds.y.shape == (0, 3)
@@ -0,0 +1,19 @@
+from spectrai.features.augmentation import SpectraAugmenter
+import numpy as np
+
+
+def test_augment_is_seeded_and_bounded():
+    X = np.tile(np.linspace(0, 1, 100), (8, 1))
+    X_aug = SpectraAugmenter(wnshift=2, noise=0.01, seed=0).augment(X)
+    np.testing.assert_array_equal(X_aug, SpectraAugmenter(wnshift=2, noise=0.01, seed=0).augment(X))
+    assert X_aug.shape == X.shape and X_aug.dtype == np.float32
+    assert np.abs(X_aug - X).max() < 0.2
+
+
+def test_flow_yields_batches():
+    X, y = np.random.rand(10, 50), np.arange(10)
+    batches = SpectraAugmenter(seed=0).flow(X, y, batch_size=4, add_channel=True)
+    sizes = [len(next(batches)[1]) for _ in range(4)]
+    assert sizes == [4, 4, 2, 4]
+    X_batch, _ = next(batches)
+    assert X_batch.shape == (4, 50, 1)
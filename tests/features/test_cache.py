@@ -0,0 +1,37 @@
+from spectrai.features.cache import CachedTransformer, TransformerCache
+from spectrai.features.preprocessing import TakeDerivative, SNV
+from sklearn.base import clone
+from sklearn.preprocessing import FunctionTransformer
+import numpy as np
+
+
+def test_cached_transformer_hits():
+    X = np.random.RandomState(0).rand(20, 50)
+    cache = TransformerCache()
+    cached = CachedTransformer(TakeDerivative(window_length=7), cache=cache)
+    X_t = cached.fit_transform(X)
+    np.testing.assert_array_equal(X_t, TakeDerivative(window_length=7).transform(X))
+    clone(cached).fit_transform(X.copy())
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    clone(cached).set_params(transformer__window_length=9).fit_transform(X)
+    assert cache.stats()['misses'] == 2
+
+
+def test_transformer_cache_spills_to_disk(tmp_path):
+    X = np.random.RandomState(0).rand(10, 100)
+    cache = TransformerCache(max_bytes=X.nbytes, spill_dir=tmp_path)
+    cached = CachedTransformer(SNV(), cache=cache)
+    X_t = cached.transform(X)
+    cached.transform(X + 1)
+    assert cache.stats()['spilled'] == 1
+    X_spilled = cached.transform(X)
+    assert isinstance(X_spilled, np.memmap)
+    np.testing.assert_array_equal(X_spilled, X_t)
+
+
+def test_cached_transformer_leaves_input_writeable():
+    X = np.random.RandomState(0).rand(5, 10)
+    X_t = CachedTransformer(FunctionTransformer(), cache=TransformerCache()).fit_transform(X)
+    assert X.flags.writeable and not X_t.flags.writeable
+    np.testing.assert_array_equal(X_t, X)
@@ -0,0 +1,32 @@
+from spectrai.features.decomposition import StreamingPCA
+from sklearn.decomposition import PCA
+import numpy as np
+
+
+def test_streaming_pca_matches_pca(spectra):
+    # Incremental SVD is exact on spectra of rank n_components
+    scores = PCA(n_components=5).fit_transform(spectra)
+    X = scores @ np.random.RandomState(0).normal(size=(5, 50))
+    pca = StreamingPCA(n_components=5, batch_size=60).fit(X)
+    expected = PCA(n_components=5).fit(X)
+    np.testing.assert_allclose(pca.explained_variance_, expected.explained_variance_, rtol=1e-6)
+
+
+def test_screening_and_persistence(spectra, tmp_path):
+    pca = StreamingPCA(n_components=5, batch_size=50).fit(spectra)
+    outlier = spectra[:1] + 5 * np.random.RandomState(1).normal(size=(1, 50))
+    assert pca.is_outlier(outlier)[0]
+    assert pca.is_outlier(spectra).mean() < 0.1
+
+    pca.save(tmp_path / 'pca.npz')
+    loaded = StreamingPCA.load(tmp_path / 'pca.npz')
+    np.testing.assert_allclose(loaded.screen(spectra[:10])[1], pca.screen(spectra[:10])[1])
+    assert loaded.q_limit_ == pca.q_limit_
+
+
+def test_short_chunks(spectra):
+    StreamingPCA(n_components=20, batch_size=10).fit(spectra)
+    pca = StreamingPCA(n_components=5).fit_chunks(spectra[i:i + 49] for i in range(0, 200, 49))
+    assert pca.n_samples_seen_ == 200
+    pca = StreamingPCA(n_components=5).fit_chunks([spectra[:3], spectra[3:4], spectra[4:]])
+    assert pca.n_samples_seen_ == 200
@@ -0,0 +1,42 @@
+from spectrai.models.neighbors import SpectralIndex, LocalPLSRegression
+import numpy as np
+
+
+def test_spectral_index_brute_matches_kdtree(spectra):
+    ids = np.arange(1000, 1200)
+    brute = SpectralIndex(n_components=5, random_state=0, max_block_size=1000).fit(spectra, ids)
+    kdtree = SpectralIndex(n_components=5, algorithm='kdtree', random_state=0).fit(spectra, ids)
+    dist_b, ids_b = brute.query(spectra[:20], k=3)
+    dist_k, ids_k = kdtree.query(spectra[:20], k=3)
+    np.testing.assert_array_equal(ids_b[:, 0], ids[:20])
+    np.testing.assert_array_equal(ids_b, ids_k)
+    np.testing.assert_allclose(dist_b, dist_k, atol=1e-3)
+
+
+def test_spectral_index_add_and_persist(spectra, tmp_path):
+    index = SpectralIndex(n_components=5, random_state=0).fit(spectra[:150], np.arange(150))
+    index.add(spectra[150:], np.arange(150, 200))
+    index.save(tmp_path / 'index.npz')
+    loaded = SpectralIndex.load(tmp_path / 'index.npz')
+    _, ids = loaded.query(spectra[150:160], k=1)
+    np.testing.assert_array_equal(ids[:, 0], np.arange(150, 160))
+
+
+def test_spectral_index_rank_deficient(spectra):
+    index = SpectralIndex(n_components=10, random_state=0).fit(spectra[:6], np.arange(6))
+    dist, ids = index.query(spectra[:6], k=1)
+    assert np.isfinite(dist).all()
+    np.testing.assert_array_equal(ids[:, 0], np.arange(6))
+
+
+def test_local_pls_regression(spectra, tmp_path):
+    X, y = spectra, spectra[:, 10] - spectra[:, 40]
+    model = LocalPLSRegression(n_neighbors=50, n_components=5, index_components=5, random_state=0)
+    y_pred = model.fit(X[:150], y[:150]).predict(X[150:])
+    assert y_pred.shape == (50,)
+    assert np.corrcoef(y_pred, y[150:])[0, 1] > 0.9
+
+    SpectralIndex(n_components=5, random_state=0).fit(X[:150], np.arange(150)).save(tmp_path / 'index.npz')
+    prebuilt = LocalPLSRegression(n_neighbors=50, n_components=5,
+                                  index=SpectralIndex.load(tmp_path / 'index.npz'))
+    np.testing.assert_allclose(prebuilt.fit(X[:150], y[:150]).predict(X[150:]), y_pred, rtol=1e-5)
@@ -0,0 +1,33 @@
+from spectrai.models.pls import KernelPLS, cross_val_predict_path
+from sklearn.cross_decomposition import PLSRegression
+from sklearn.model_selection import ShuffleSplit
+import numpy as np
+import pytest
+
+
+def test_kernel_pls_matches_sklearn_for_all_components(spectra):
+    X, y = spectra[:60], spectra[:60, 10] - spectra[:60, 40]
+    y_path = KernelPLS(n_components=4).fit(X, y).predict_path(X)
+    for k in range(1, 5):
+        expected = PLSRegression(n_components=k).fit(X, y).predict(X).ravel()
+        np.testing.assert_allclose(y_path[k - 1], expected, atol=1e-8)
+
+
+def test_kernel_pls_validates_n_components(spectra):
+    X, y = spectra[:10], spectra[:10, 0]
+    model = KernelPLS(n_components=3).fit(X, y)
+    for n_components in [0, -1, 4]:
+        with pytest.raises(ValueError):
+            model.predict(X, n_components=n_components)
+    with pytest.raises(ValueError):
+        KernelPLS(n_components=11).fit(X, y)
+
+
+def test_cross_val_predict_path(spectra):
+    X, y = spectra[:60], spectra[:60, 10] - spectra[:60, 40]
+    y_pred = cross_val_predict_path(X, y, n_components=5, cv=3, n_jobs=2)
+    assert y_pred.shape == (5, 60)
+    rmse = np.sqrt(np.mean((y_pred - y) ** 2, axis=1))
+    assert rmse[2] < rmse[0]
+    with pytest.raises(ValueError):
+        cross_val_predict_path(X, y, n_components=5, cv=ShuffleSplit(3, random_state=0))
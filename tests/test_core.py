@@ -0,0 +1,67 @@
+from spectrai.core import (enable_profiling, disable_profiling, reset_profiling,
+                           get_spans, span, export_profile)
+from spectrai.features.preprocessing import SNV
+import numpy as np
+import json
+
+
+def test_profiling_disabled_by_default():
+    reset_profiling()
+    SNV().transform(np.random.rand(5, 10))
+    assert get_spans() == []
+
+
+def test_profiling_spans_and_export(tmp_path):
+    reset_profiling()
+    enable_profiling(trace_memory=True)
+    try:
+        with span('pipeline') as record:
+            SNV().transform(np.random.rand(5, 10))
+            record['rows'] = 5
+    finally:
+        disable_profiling()
+
+    spans = get_spans()
+    assert [s['name'] for s in spans] == ['spectrai.features.preprocessing.SNV.transform',
+                                          'pipeline']
+    assert spans[0]['rows'] == 5 and spans[0]['parent'] == 'pipeline'
+    assert spans[1]['peak_traced_mb'] >= spans[0]['peak_traced_mb'] > 0
+    assert spans[1]['rss_mb'] > 0 and spans[1]['max_rss_growth_mb'] >= 0
+
+    export_profile(tmp_path / 'trace.json', format='chrome')
+    with open(tmp_path / 'trace.json') as f:
+        events = json.load(f)['traceEvents']
+    assert len(events) == 2 and events[0]['ph'] == 'X'
+    reset_profiling()
+
+
+def test_profiling_memory_without_reset_peak(monkeypatch):
+    monkeypatch.setattr('spectrai.core._HAS_RESET_PEAK', False)
+    reset_profiling()
+    enable_profiling(trace_memory=True)
+    try:
+        with span('outer'):
+            with span('inner'):
+                X = np.ones(10**6)
+            del X
+    finally:
+        disable_profiling()
+    inner, outer = get_spans()
+    assert inner['peak_traced_mb'] > 7 and outer['peak_traced_mb'] >= inner['peak_traced_mb']
+    reset_profiling()
+
+
+def test_profiling_rss_delta():
+    reset_profiling()
+    enable_profiling()
+    try:
+        with span('allocate'):
+            X = np.ones(2 * 10**7)
+        with span('idle'):
+            pass
+    finally:
+        disable_profiling()
+    allocate, idle = get_spans()
+    assert allocate['rss_delta_mb'] > 100 and abs(idle['rss_delta_mb']) < 10
+    assert X.sum() > 0
+    reset_profiling()
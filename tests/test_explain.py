@@ -0,0 +1,59 @@
+from spectrai.explain import summarize_background, explain, wavenumber_importance, _as_array
+import numpy as np
+
+
+class FakeModel:
+    def __init__(self, w):
+        self.w = w
+
+    def get_weights(self):
+        return [self.w]
+
+
+class FakeExplainer:
+    """Exact attributions of a linear model with zero background"""
+    def __init__(self, w):
+        self.w = w
+        self.nb_calls = 0
+
+    def shap_values(self, X):
+        self.nb_calls += 1
+        return [X * self.w]
+
+
+def test_summarize_background():
+    X = np.random.RandomState(0).rand(200, 30).astype('float32')
+    assert summarize_background(X, 10, method='kmeans', seed=0).shape == (10, 30)
+    medoids = summarize_background(X, 10, seed=0)
+    assert all((X == m).all(axis=1).any() for m in medoids)
+
+
+def test_explain_batches_and_caches(tmp_path):
+    X, w = np.random.RandomState(0).rand(10, 5), np.arange(5.)
+    background = np.zeros((1, 5))
+    explainer = FakeExplainer(w)
+    attributions = explain(FakeModel(w), X, np.arange(10), background, batch_size=4,
+                           cache_dir=tmp_path, explainer=explainer)
+    assert attributions.shape == (10, 5, 1) and explainer.nb_calls == 3
+    np.testing.assert_allclose(attributions[..., 0], X * w)
+
+    attributions = explain(FakeModel(w), X, np.arange(10), background, batch_size=4,
+                           cache_dir=tmp_path, explainer=explainer)
+    assert explainer.nb_calls == 3
+    assert wavenumber_importance(attributions).shape == (5, 1)
+
+    # Changed spectrum behind an id or changed background are recomputed
+    X[0] += 1
+    attributions = explain(FakeModel(w), X, np.arange(10), background, batch_size=4,
+                           cache_dir=tmp_path, explainer=explainer)
+    assert explainer.nb_calls == 4
+    np.testing.assert_allclose(attributions[0, :, 0], X[0] * w)
+    explain(FakeModel(w), X, np.arange(10), np.ones((1, 5)), batch_size=4,
+            cache_dir=tmp_path, explainer=explainer)
+    assert explainer.nb_calls == 7
+
+
+def test_as_array_squeezes_channel_axis():
+    assert _as_array([np.zeros((3, 5, 1)), np.zeros((3, 5, 1))]).shape == (3, 5, 2)
+    assert _as_array(np.zeros((3, 5, 1, 2))).shape == (3, 5, 2)
+    assert _as_array(np.zeros((3, 5))).shape == (3, 5, 1)
@@ -0,0 +1,82 @@
+from spectrai.serving import MicroBatcher, PredictionServer, request_predictions
+from spectrai.features.preprocessing import SNV
+from sklearn.pipeline import Pipeline
+from sklearn.linear_model import LinearRegression
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+
+
+def test_micro_batcher_groups_requests():
+    calls = []
+
+    def predict(X):
+        calls.append(len(X))
+        return X.sum(axis=1)
+
+    batcher = MicroBatcher(predict, max_batch_size=100, max_latency=0.2)
+    X = np.arange(20, dtype='float32').reshape(10, 2)
+    futures = [batcher.submit(X[i:i + 2]) for i in range(0, 10, 2)]
+    y = np.concatenate([f.result(timeout=5) for f in futures])
+    batcher.close()
+    np.testing.assert_allclose(y, X.sum(axis=1))
+    assert len(calls) < 5
+    assert batcher.stats()['samples'] == 10
+
+
+def test_prediction_server_tcp(spectra):
+    X = spectra[:50, :30]
+    pipe = Pipeline([('snv', SNV()), ('model', LinearRegression())]).fit(X, X[:, 5] - X[:, 20])
+    with PredictionServer(pipe, port=0) as server:
+        _, port = server.address
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(
+                lambda i: request_predictions(X[i:i + 5], port=port), range(0, 50, 5)))
+    np.testing.assert_allclose(np.concatenate(results), pipe.predict(X))
+
+
+def test_prediction_server_unix_socket(spectra, tmp_path):
+    X = spectra[:50, :30]
+    pipe = Pipeline([('snv', SNV()), ('model', LinearRegression())]).fit(X, X[:, 5] - X[:, 20])
+    socket_path = tmp_path / 'spectrai.sock'
+    with PredictionServer(pipe, unix_socket=socket_path):
+        y = request_predictions(X[:3], unix_socket=socket_path)
+    np.testing.assert_allclose(y, pipe.predict(X[:3]))
+
+
+def test_prediction_server_learns_width_from_valid_requests(spectra):
+    X = spectra[:50, :30]
+    pipe = Pipeline([('snv', SNV()), ('model', LinearRegression())]).fit(X, X[:, 5] - X[:, 20])
+    with PredictionServer(pipe, port=0) as server:
+        _, port = server.address
+        for malformed in [X[:2, :29], np.empty((0, 30)), [[]]]:
+            with pytest.raises(RuntimeError):
+                request_predictions(malformed, port=port)
+        np.testing.assert_allclose(request_predictions(X[:2], port=port), pipe.predict(X[:2]))
+        with pytest.raises(RuntimeError, match='30 expected'):
+            request_predictions(X[:2, :29], port=port)
+
+
+def test_micro_batcher_isolates_faulty_requests():
+    batcher = MicroBatcher(lambda X: X.sum(axis=1), max_batch_size=3, max_latency=0.2)
+    good = batcher.submit(np.ones((2, 5)))
+    np.testing.assert_allclose(good.result(timeout=5), [5, 5])
+    with pytest.raises(ValueError):
+        batcher.submit(np.ones((1, 7)))
+    large = batcher.submit(np.ones((7, 5)))
+    np.testing.assert_allclose(large.result(timeout=5), np.full(7, 5))
+    batcher.close()
+
+
+def test_micro_batcher_reruns_failed_batch_per_request():
+    def predict(X):
+        if np.isnan(X).any():
+            raise ValueError('NaN in spectra')
+        return X.sum(axis=1)
+
+    batcher = MicroBatcher(predict, max_batch_size=10, max_latency=0.2)
+    good, bad = batcher.submit(np.ones((2, 3))), batcher.submit(np.full((1, 3), np.nan))
+    np.testing.assert_allclose(good.result(timeout=5), [3, 3])
+    assert isinstance(bad.exception(timeout=5), ValueError)
+    batcher.close()
+    assert batcher.stats()['errors'] == 1